@@ -0,0 +1,31 @@
+"""indexes: unique (user_id, word) on user_dictionary, (user_id, upload_date) on user_files
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 15:40:12.204118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Дубли, накопленные при гонке SELECT + INSERT, не дадут создать уникальный индекс:
+    # оставляем самую новую запись каждого слова
+    op.execute(
+        "DELETE FROM user_dictionary WHERE id NOT IN ("
+        "SELECT MAX(id) FROM user_dictionary GROUP BY user_id, word)"
+    )
+    op.create_index('ix_user_dictionary_user_id_word', 'user_dictionary', ['user_id', 'word'], unique=True)
+    op.create_index('ix_user_files_user_id_upload_date', 'user_files', ['user_id', 'upload_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_files_user_id_upload_date', table_name='user_files')
+    op.drop_index('ix_user_dictionary_user_id_word', table_name='user_dictionary')
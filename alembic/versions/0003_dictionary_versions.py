@@ -0,0 +1,31 @@
+"""dictionary versions for ETag and (user_id, created_at, id) index for keyset pagination
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 16:05:47.318920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('dictionary_versions',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_user_dictionary_user_id_created_at_id', 'user_dictionary', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_dictionary_user_id_created_at_id', table_name='user_dictionary')
+    op.drop_table('dictionary_versions')
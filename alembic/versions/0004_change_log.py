@@ -0,0 +1,53 @@
+"""change feed: per-user change sequence and compacted change log with tombstones
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:48:03.772051
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('change_sequences',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('seq', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('change_log',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('entity', sa.String(length=16), nullable=False),
+    sa.Column('entity_key', sa.Text(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'entity', 'entity_key')
+    )
+    op.create_index('ix_change_log_user_id_seq', 'change_log', ['user_id', 'seq'], unique=False)
+
+    # Всё, что уже есть в базе, попадает в ленту с номером 1: клиент с since=0 получит полную копию
+    op.execute(
+        "INSERT INTO change_log (user_id, entity, entity_key, seq, deleted) "
+        "SELECT user_id, 'dictionary', word, 1, false FROM user_dictionary"
+    )
+    op.execute(
+        "INSERT INTO change_log (user_id, entity, entity_key, seq, deleted) "
+        "SELECT f.user_id, 'mapping', m.file_id, 1, false "
+        "FROM files_with_mapping m JOIN user_files f ON f.id = m.file_id"
+    )
+    op.execute("INSERT INTO change_sequences (user_id, seq) SELECT DISTINCT user_id, 1 FROM change_log")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_change_log_user_id_seq', table_name='change_log')
+    op.drop_table('change_log')
+    op.drop_table('change_sequences')
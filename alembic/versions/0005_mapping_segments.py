@@ -0,0 +1,83 @@
+"""mapping segments: book mapping stored in fixed-size paragraph segments
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 17:32:11.904217
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Размер сегмента, с которым переносятся уже подготовленные книги
+SEGMENT_SIZE = 50
+
+
+def upgrade() -> None:
+    op.create_table('mapping_segments',
+    sa.Column('file_id', sa.String(length=36), nullable=False),
+    sa.Column('ordinal', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('first_paragraph', sa.Integer(), nullable=False),
+    sa.Column('paragraph_count', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['file_id'], ['user_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id', 'ordinal')
+    )
+    with op.batch_alter_table('files_with_mapping') as batch_op:
+        batch_op.add_column(sa.Column('paragraph_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('segment_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    # Переносим сопоставления из одного JSON в сегменты; формат сегмента тот же,
+    # что пишет app.services.book_mapping
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT file_id, mapping_data FROM files_with_mapping")).fetchall()
+    for file_id, mapping_data in rows:
+        items = sorted((int(i), paragraph) for i, paragraph in json.loads(mapping_data).items())
+        segments = []
+        for ordinal, start in enumerate(range(0, len(items), SEGMENT_SIZE)):
+            chunk = items[start:start + SEGMENT_SIZE]
+            segments.append({
+                "file_id": file_id,
+                "ordinal": ordinal,
+                "first_paragraph": chunk[0][0],
+                "paragraph_count": len(chunk),
+                "data": json.dumps({str(i): p for i, p in chunk}, ensure_ascii=False)[1:-1],
+            })
+        if segments:
+            conn.execute(sa.text(
+                "INSERT INTO mapping_segments (file_id, ordinal, first_paragraph, paragraph_count, data) "
+                "VALUES (:file_id, :ordinal, :first_paragraph, :paragraph_count, :data)"
+            ), segments)
+        conn.execute(sa.text(
+            "UPDATE files_with_mapping SET mapping_data = '', paragraph_count = :paragraph_count, "
+            "segment_size = :segment_size, version = 1 WHERE file_id = :file_id"
+        ), {"file_id": file_id, "paragraph_count": len(items), "segment_size": SEGMENT_SIZE})
+
+
+def downgrade() -> None:
+    # Собираем JSON обратно из сегментов
+    conn = op.get_bind()
+    file_ids = conn.execute(sa.text("SELECT file_id FROM files_with_mapping WHERE paragraph_count IS NOT NULL")).scalars().all()
+    for file_id in file_ids:
+        fragments = conn.execute(
+            sa.text("SELECT data FROM mapping_segments WHERE file_id = :file_id ORDER BY ordinal"),
+            {"file_id": file_id}
+        ).scalars().all()
+        conn.execute(
+            sa.text("UPDATE files_with_mapping SET mapping_data = :mapping_data WHERE file_id = :file_id"),
+            {"file_id": file_id, "mapping_data": "{" + ", ".join(fragments) + "}"}
+        )
+    with op.batch_alter_table('files_with_mapping') as batch_op:
+        batch_op.drop_column('version')
+        batch_op.drop_column('segment_size')
+        batch_op.drop_column('paragraph_count')
+    op.drop_table('mapping_segments')
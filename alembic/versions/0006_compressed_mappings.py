@@ -0,0 +1,78 @@
+"""compressed mappings: binary segments with a format byte and a pre-serialized payload
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 18:05:47.120385
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# Байт формата блоба, как в app.services.book_mapping: 0 — без сжатия, 1 — gzip
+IDENTITY, GZIP = 0, 1
+
+
+def _gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return bytes([GZIP]) + compressor.compress(data) + compressor.flush()
+
+
+def _raw(value) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else bytes(value)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('files_with_mapping') as batch_op:
+        batch_op.add_column(sa.Column('payload', sa.LargeBinary(), nullable=True))
+    with op.batch_alter_table('mapping_segments') as batch_op:
+        batch_op.alter_column('data', existing_type=sa.Text(), type_=sa.LargeBinary(),
+                              existing_nullable=False, postgresql_using="convert_to(data, 'UTF8')")
+
+    # Сегменты сжимаем gzip, из них же собираем полный JSON для payload
+    conn = op.get_bind()
+    file_ids = conn.execute(sa.text("SELECT file_id FROM files_with_mapping WHERE paragraph_count IS NOT NULL")).scalars().all()
+    for file_id in file_ids:
+        segments = conn.execute(
+            sa.text("SELECT ordinal, data FROM mapping_segments WHERE file_id = :file_id ORDER BY ordinal"),
+            {"file_id": file_id}
+        ).fetchall()
+        fragments = [_raw(data) for _, data in segments]
+        for (ordinal, _), fragment in zip(segments, fragments):
+            conn.execute(
+                sa.text("UPDATE mapping_segments SET data = :data WHERE file_id = :file_id AND ordinal = :ordinal"),
+                {"file_id": file_id, "ordinal": ordinal, "data": _gzip(fragment)}
+            )
+        conn.execute(
+            sa.text("UPDATE files_with_mapping SET payload = :payload WHERE file_id = :file_id"),
+            {"file_id": file_id, "payload": _gzip(b"{" + b",".join(fragments) + b"}")}
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for file_id, ordinal, data in conn.execute(sa.text("SELECT file_id, ordinal, data FROM mapping_segments")).fetchall():
+        blob = _raw(data)
+        if blob[0] == GZIP:
+            fragment = zlib.decompress(blob[1:], 47)
+        elif blob[0] == IDENTITY:
+            fragment = blob[1:]
+        else:
+            raise RuntimeError(f"Cannot downgrade mapping of file {file_id}: unsupported blob format {blob[0]}")
+        conn.execute(
+            sa.text("UPDATE mapping_segments SET data = :data WHERE file_id = :file_id AND ordinal = :ordinal"),
+            {"file_id": file_id, "ordinal": ordinal, "data": fragment.decode("utf-8")}
+        )
+    with op.batch_alter_table('mapping_segments') as batch_op:
+        batch_op.alter_column('data', existing_type=sa.LargeBinary(), type_=sa.Text(),
+                              existing_nullable=False, postgresql_using="convert_from(data, 'UTF8')")
+    with op.batch_alter_table('files_with_mapping') as batch_op:
+        batch_op.drop_column('payload')
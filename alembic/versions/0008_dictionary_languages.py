@@ -0,0 +1,28 @@
+"""user_dictionary: language pair of each word
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 10:12:47.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Пара языков прежних слов неизвестна: они остаются без неё и не попадают в память переводов
+    op.add_column('user_dictionary', sa.Column('source_lang', sa.String(length=8), nullable=True))
+    op.add_column('user_dictionary', sa.Column('target_lang', sa.String(length=8), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('user_dictionary') as batch_op:
+        batch_op.drop_column('target_lang')
+        batch_op.drop_column('source_lang')
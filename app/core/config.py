@@ -36,8 +36,112 @@ class Settings(BaseSettings):
             
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    # Пул соединений с PostgreSQL (на каждый процесс приложения)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    
+    # Соединения с SQLite: пул, WAL и параметры, которые задаются каждому соединению
+    SQLITE_POOL_SIZE: int = int(os.getenv("SQLITE_POOL_SIZE", 8))
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", 16384))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_BUSY_TIMEOUT: float = float(os.getenv("SQLITE_BUSY_TIMEOUT", 5))
+    SQLITE_CACHED_STATEMENTS: int = int(os.getenv("SQLITE_CACHED_STATEMENTS", 256))
+    
     # Настройки CORS
     BACKEND_CORS_ORIGINS: list = ["*"]
+
+    # Настройки кэша переводов
+    TRANSLATION_CACHE_DB: str = os.getenv("TRANSLATION_CACHE_DB", "translation_cache.db")
+    TRANSLATION_CACHE_SIZE: int = int(os.getenv("TRANSLATION_CACHE_SIZE", 10000))
+    TRANSLATION_CACHE_TTL: int = int(os.getenv("TRANSLATION_CACHE_TTL", 3600))
+    TRANSLATION_CACHE_DB_TTL: int = int(os.getenv("TRANSLATION_CACHE_DB_TTL", 30 * 24 * 3600))
+    # Как часто (в секундах) удалять из SQLite переводы старше TRANSLATION_CACHE_DB_TTL
+    TRANSLATION_CACHE_PURGE_INTERVAL: int = int(os.getenv("TRANSLATION_CACHE_PURGE_INTERVAL", 3600))
+
+    # Пулы потоков для блокирующих бэкендов перевода
+    TRANSLATION_BACKEND_CONCURRENCY: str = os.getenv("TRANSLATION_BACKEND_CONCURRENCY", "google=8")
+    TRANSLATION_DEFAULT_CONCURRENCY: int = int(os.getenv("TRANSLATION_DEFAULT_CONCURRENCY", 4))
+    TRANSLATION_MAX_QUEUE: int = int(os.getenv("TRANSLATION_MAX_QUEUE", 100))
+    TRANSLATION_DEADLINE: float = float(os.getenv("TRANSLATION_DEADLINE", 20))
+
+    # Бэкенд внешнего перевода и его HTTP-клиент
+    TRANSLATION_BACKEND: str = os.getenv("TRANSLATION_BACKEND", "google")
+    TRANSLATION_HTTP_POOL_SIZE: int = int(os.getenv("TRANSLATION_HTTP_POOL_SIZE", 8))
+    TRANSLATION_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("TRANSLATION_HTTP_CONNECT_TIMEOUT", 3.05))
+    TRANSLATION_HTTP_READ_TIMEOUT: float = float(os.getenv("TRANSLATION_HTTP_READ_TIMEOUT", 8))
+    TRANSLATION_HTTP_RETRIES: int = int(os.getenv("TRANSLATION_HTTP_RETRIES", 2))
+
+    # Бюджет ожидания внешнего сервиса до ответа словарём (0 — ждать до дедлайна).
+    # Действует только для коротких текстов (клик по слову, фраза): страницу целиком
+    # незачем подменять пословным переводом
+    TRANSLATION_HEDGE_BUDGET: float = float(os.getenv("TRANSLATION_HEDGE_BUDGET", 1.5))
+    TRANSLATION_HEDGE_MAX_LENGTH: int = int(os.getenv("TRANSLATION_HEDGE_MAX_LENGTH", 200))
+    # Предохранитель: сколько ошибок подряд отключают сервис и на сколько секунд
+    TRANSLATION_BREAKER_THRESHOLD: int = int(os.getenv("TRANSLATION_BREAKER_THRESHOLD", 5))
+    TRANSLATION_BREAKER_RESET_TIMEOUT: float = float(os.getenv("TRANSLATION_BREAKER_RESET_TIMEOUT", 30))
+
+    # Разбиение длинных текстов на куски для внешнего сервиса
+    TRANSLATION_CHUNK_SIZE: int = int(os.getenv("TRANSLATION_CHUNK_SIZE", 4500))
+    TRANSLATION_CHUNK_PARALLELISM: int = int(os.getenv("TRANSLATION_CHUNK_PARALLELISM", 4))
+    TRANSLATION_STREAM_CHUNK_SIZE: int = int(os.getenv("TRANSLATION_STREAM_CHUNK_SIZE", 1000))
+    TRANSLATION_BATCH_MAX_SEGMENTS: int = int(os.getenv("TRANSLATION_BATCH_MAX_SEGMENTS", 500))
+
+    # Память переводов из подготовленных книг и пользовательских словарей
+    TRANSLATION_MEMORY_SHINGLE_SIZE: int = int(os.getenv("TRANSLATION_MEMORY_SHINGLE_SIZE", 2))
+    TRANSLATION_MEMORY_THRESHOLD: float = float(os.getenv("TRANSLATION_MEMORY_THRESHOLD", 0.85))
+    TRANSLATION_MEMORY_MIN_WORDS: int = int(os.getenv("TRANSLATION_MEMORY_MIN_WORDS", 6))
+    # Память пользователя читается при первом обращении и перечитывается через REFRESH секунд
+    TRANSLATION_MEMORY_REFRESH: int = int(os.getenv("TRANSLATION_MEMORY_REFRESH", 300))
+    TRANSLATION_MEMORY_MAX_USERS: int = int(os.getenv("TRANSLATION_MEMORY_MAX_USERS", 1000))
+
+    # Упреждающий перевод следующих страниц: глубина, страниц в работе на
+    # пользователя и общий лимит фоновых задач
+    TRANSLATION_PREFETCH_PAGES: int = int(os.getenv("TRANSLATION_PREFETCH_PAGES", 2))
+    TRANSLATION_PREFETCH_USER_BUDGET: int = int(os.getenv("TRANSLATION_PREFETCH_USER_BUDGET", 2))
+    TRANSLATION_PREFETCH_CONCURRENCY: int = int(os.getenv("TRANSLATION_PREFETCH_CONCURRENCY", 2))
+    # Сколько последних читателей помнить; давно не читавшие вытесняются
+    TRANSLATION_PREFETCH_MAX_READERS: int = int(os.getenv("TRANSLATION_PREFETCH_MAX_READERS", 1000))
+
+    # Массовый импорт в пользовательский словарь: строк на транзакцию и предел на файл
+    DICTIONARY_IMPORT_BATCH_SIZE: int = int(os.getenv("DICTIONARY_IMPORT_BATCH_SIZE", 1000))
+    DICTIONARY_IMPORT_MAX_ROWS: int = int(os.getenv("DICTIONARY_IMPORT_MAX_ROWS", 100000))
+
+    # Сколько пользовательских словарей держать в памяти для пакетной проверки слов
+    DICTIONARY_CACHE_USERS: int = int(os.getenv("DICTIONARY_CACHE_USERS", 1000))
+    DICTIONARY_CHECK_MAX_WORDS: int = int(os.getenv("DICTIONARY_CHECK_MAX_WORDS", 5000))
+
+    # Отложенная запись новых слов: пачка всех запросов за окно (в секундах) — одна транзакция
+    DICTIONARY_WRITE_BEHIND: bool = os.getenv("DICTIONARY_WRITE_BEHIND", "False").lower() in ("true", "1", "t")
+    DICTIONARY_WRITE_BEHIND_WINDOW: float = float(os.getenv("DICTIONARY_WRITE_BEHIND_WINDOW", 0.005))
+    DICTIONARY_WRITE_BEHIND_MAX_BATCH: int = int(os.getenv("DICTIONARY_WRITE_BEHIND_MAX_BATCH", 1000))
+    # После стольких неудачных попыток слово отбрасывается с записью в лог
+    DICTIONARY_WRITE_BEHIND_MAX_ATTEMPTS: int = int(os.getenv("DICTIONARY_WRITE_BEHIND_MAX_ATTEMPTS", 3))
+
+    # Сколько абзацев подготовленной книги хранится в одном сегменте сопоставления
+    MAPPING_SEGMENT_SIZE: int = int(os.getenv("MAPPING_SEGMENT_SIZE", 50))
+    # Сжатие сохранённых сопоставлений: gzip, zstd (пакет zstandard), br (пакет brotli) или identity
+    MAPPING_COMPRESSION: str = os.getenv("MAPPING_COMPRESSION", "gzip")
+    MAPPING_COMPRESSION_LEVEL: int = int(os.getenv("MAPPING_COMPRESSION_LEVEL", 6))
+    # Полный JSON большей книги целиком не сохраняется (он собирается при подготовке в
+    # памяти) — такие книги отдаются потоком из сегментов
+    MAPPING_PAYLOAD_MAX_BYTES: int = int(os.getenv("MAPPING_PAYLOAD_MAX_BYTES", 8 * 1024 * 1024))
+
+    # Полуширина полосы поиска при выравнивании абзацев книги (расширяется сама, если не хватило)
+    ALIGNMENT_BAND: int = int(os.getenv("ALIGNMENT_BAND", 50))
+    ALIGNMENT_MAX_BAND: int = int(os.getenv("ALIGNMENT_MAX_BAND", 800))
+
+    # Фоновые задачи (подготовка книг): воркеров на процесс, период опроса очереди,
+    # через сколько секунд без отметок живости задача считается брошенной, число попыток
+    JOBS_CONCURRENCY: int = int(os.getenv("JOBS_CONCURRENCY", 2))
+    JOBS_POLL_INTERVAL: float = float(os.getenv("JOBS_POLL_INTERVAL", 2))
+    JOBS_STALE_TIMEOUT: float = float(os.getenv("JOBS_STALE_TIMEOUT", 120))
+    JOBS_MAX_ATTEMPTS: int = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+
+    # Каталог скомпилированных словарей для офлайн-перевода ({source}-{target}.dict)
+    DICTIONARY_DIR: str = os.getenv("DICTIONARY_DIR", "dictionaries")
     
     class Config:
         env_file = ".env"
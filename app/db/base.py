@@ -2,5 +2,17 @@
 from app.db.base_class import Base  # noqa
 try:
     from app.models.user import User  # noqa
+    from app.models.reader import (  # noqa
+        ReaderUser,
+        UserFile,
+        FileMapping,
+        MappingSegment,
+        DictionaryEntry,
+        DictionaryVersion,
+        FilePage,
+        ChangeSequence,
+        ChangeLogEntry,
+        Job,
+    )
 except ImportError:
     pass 
\ No newline at end of file
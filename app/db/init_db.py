@@ -1,11 +1,73 @@
 import logging
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
 from app.db.base import Base
 from app.db.session import engine
 
+# Дубли слов в словаре мешают уникальному индексу: оставляем самую новую запись
+DEDUPLICATE_DICTIONARY_SQL = """
+    DELETE FROM user_dictionary WHERE id NOT IN (
+        SELECT MAX(id) FROM user_dictionary GROUP BY user_id, word
+    )
+"""
+
+
+# Ленту изменений для данных, появившихся до неё, заполняем одним номером 1
+BACKFILL_CHANGE_LOG_SQL = (
+    """
+    INSERT INTO change_log (user_id, entity, entity_key, seq, deleted)
+    SELECT user_id, 'dictionary', word, 1, false FROM user_dictionary
+    """,
+    """
+    INSERT INTO change_log (user_id, entity, entity_key, seq, deleted)
+    SELECT f.user_id, 'mapping', m.file_id, 1, false
+    FROM files_with_mapping m JOIN user_files f ON f.id = m.file_id
+    """,
+    "INSERT INTO change_sequences (user_id, seq) SELECT DISTINCT user_id, 1 FROM change_log",
+)
+
 
 # Создание всех таблиц в базе данных
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
-    logging.info("Database tables created") 
\ No newline at end of file
+    add_missing_columns()
+    create_missing_indexes()
+    backfill_change_log()
+    logging.info("Database tables created")
+
+
+def add_missing_columns() -> None:
+    """Колонки, добавленные в модели позже, досоздаём так же, как индексы (только nullable или с default)"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+
+def create_missing_indexes() -> None:
+    """create_all не трогает существующие таблицы, поэтому индексы, добавленные позже, досоздаём"""
+    with engine.begin() as conn:
+        indexes = {index["name"] for index in inspect(conn).get_indexes("user_dictionary")}
+        if "ix_user_dictionary_user_id_word" not in indexes:
+            conn.execute(text(DEDUPLICATE_DICTIONARY_SQL))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_change_log() -> None:
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM change_sequences LIMIT 1")).fetchone():
+            return
+        for statement in BACKFILL_CHANGE_LOG_SQL:
+            conn.execute(text(statement))
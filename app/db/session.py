@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
@@ -8,6 +8,45 @@ from app.core.config import settings
 # Определяем, использовать ли SQLite для локальной разработки
 USE_SQLITE = os.getenv("USE_SQLITE", "True").lower() in ("true", "1", "t")
 
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Настраивает каждое новое соединение пула: WAL позволяет читать во время
+    записи, busy_timeout ждёт блокировку вместо немедленного 'database is locked'.
+    """
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if synchronous not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS mode '{settings.SQLITE_SYNCHRONOUS}'")
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engine(url: str):
+    """Пул соединений к файлу SQLite с кэшем подготовленных выражений"""
+    engine = create_engine(
+        url,
+        pool_size=settings.SQLITE_POOL_SIZE,
+        max_overflow=settings.SQLITE_POOL_SIZE,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT,
+            "cached_statements": settings.SQLITE_CACHED_STATEMENTS,
+        },
+    )
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
 if settings.USE_SQLITE_MEMORY:
     # SQLite в памяти для быстрого тестирования
     SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -17,12 +56,18 @@ if settings.USE_SQLITE_MEMORY:
 elif USE_SQLITE:
     # SQLite для локальной разработки
     SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+    engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL)
+else:
+    # PostgreSQL для продакшена: общий пул на процесс, pre_ping отбрасывает
+    # соединения, разорванные сервером или балансировщиком
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        settings.get_database_uri,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
     )
-else:
-    # PostgreSQL для продакшена
-    engine = create_engine(settings.get_database_uri)
 
 # Фабрика сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -33,4 +78,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -1,37 +1,70 @@
+import asyncio
+import base64
+import csv
+import io
 import logging
+import re
 from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form, Query, Body, Cookie
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-import sqlite3
 import uuid
 import os
 import shutil
 from pathlib import Path
-import requests
-import re
 import json
-from deep_translator import GoogleTranslator
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
-from sqlite3 import IntegrityError
 import hashlib
 import secrets
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.init_db import init_db as create_tables
+from app.db.session import engine
+from app.services.translation_cache import translation_cache
+from app.services.translation_executor import (
+    TranslationOverloaded,
+    TranslationTimeout,
+    translation_executors,
+)
+from app.services.bilingual_dictionary import dictionary_registry
+from app.services.offline_translator import CLEANUP_RULES, OfflineTranslator
+from app.services.translation import TranslationService
+from app.services.translator_backends import create_backend
+from app.services.translation_memory import MemoryItem, translation_memory
+from app.services.prefetch import PrefetchScheduler
+from app.services.known_words import known_words_cache, normalize_word
+from app.services.write_behind import WriteBehindBuffer
+from app.services.aligner import align
+from app.services.job_queue import JobQueue, hold_claim
+from app.services.book_text import iter_bead_mapping, iter_paragraphs, paragraph_lengths, save_stream
+from app.services.book_mapping import (
+    blob_content,
+    blob_encoding,
+    decode_blob,
+    delete_mapping,
+    dumps,
+    iter_mapping_json,
+    iter_mapping_paragraphs,
+    load_mapping_json,
+    load_mapping_meta,
+    load_mapping_payload,
+    load_mapping_range,
+    save_mapping,
+)
 
 # Настраиваем логирование
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Создаем SQLAlchemy engine для работы с базой данных
-engine = create_engine("sqlite:///app.db", connect_args={"check_same_thread": False})
-
 # Создаем инстанс FastAPI
 app = FastAPI(
     title="Book Reader & Translator",
@@ -66,6 +99,10 @@ UPLOAD_DIR = Path("uploads")
 if not UPLOAD_DIR.exists():
     UPLOAD_DIR.mkdir(parents=True)
 
+# Исходные тексты фоновых задач подготовки книг (удаляются по завершении задачи)
+JOBS_DIR = UPLOAD_DIR / "jobs"
+JOBS_DIR.mkdir(exist_ok=True)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -80,58 +117,10 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Инициализация базы данных
 def init_db():
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id TEXT PRIMARY KEY,
-        username TEXT UNIQUE,
-        email TEXT UNIQUE,
-        hashed_password TEXT,
-        is_active BOOLEAN DEFAULT 1,
-        is_superuser BOOLEAN DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_files (
-        id TEXT PRIMARY KEY,
-        user_id TEXT,
-        filename TEXT,
-        original_filename TEXT,
-        file_size INTEGER,
-        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # Создаем таблицу для хранения сопоставлений текстов
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS files_with_mapping
-    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-    file_id INTEGER NOT NULL,
-    mapping_data TEXT NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (file_id) REFERENCES user_files (id) ON DELETE CASCADE,
-    UNIQUE(file_id))
-    ''')
-    
-    # Создаем таблицу для хранения информации о подготовленных файлах, если она не существует
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_dictionary (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        word TEXT NOT NULL,
-        translation TEXT NOT NULL,
-        context TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    # Схемой PostgreSQL управляют миграции Alembic (alembic upgrade head),
+    # локальную SQLite для разработки создаём по моделям app/models
+    if engine.dialect.name == "sqlite":
+        create_tables()
     logger.info("Database initialized")
 
 # Схемы данных
@@ -190,11 +179,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 # Функции для работы с пользователями
 def get_user(username: str):
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, email, hashed_password, is_active, is_superuser FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
-    conn.close()
+    with engine.connect() as conn:
+        user = conn.execute(
+            text("SELECT id, username, email, hashed_password, is_active, is_superuser FROM users WHERE username = :username"),
+            {"username": username}
+        ).fetchone()
     
     if user:
         return {
@@ -211,14 +200,22 @@ def create_user(user: UserCreate):
     hashed_password = get_password_hash(user.password)
     user_id = str(uuid.uuid4())
     
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO users (id, username, email, hashed_password, is_active, is_superuser) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, user.username, user.email, hashed_password, user.is_active, user.is_superuser)
-        )
-        conn.commit()
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO users (id, username, email, hashed_password, is_active, is_superuser) "
+                    "VALUES (:id, :username, :email, :hashed_password, :is_active, :is_superuser)"
+                ),
+                {
+                    "id": user_id,
+                    "username": user.username,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "is_active": user.is_active,
+                    "is_superuser": user.is_superuser,
+                }
+            )
         return {
             "id": user_id,
             "username": user.username,
@@ -226,11 +223,8 @@ def create_user(user: UserCreate):
             "is_active": user.is_active,
             "is_superuser": user.is_superuser
         }
-    except sqlite3.IntegrityError:
-        conn.rollback()
+    except IntegrityError:
         return None
-    finally:
-        conn.close()
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -280,14 +274,20 @@ def save_uploaded_file(file: UploadFile, user_id: str) -> Optional[dict]:
         file_size = os.path.getsize(file_path)
         
         # Сохраняем информацию о файле в БД
-        conn = sqlite3.connect('app.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO user_files (id, user_id, filename, original_filename, file_size) VALUES (?, ?, ?, ?, ?)",
-            (file_id, user_id, new_filename, file.filename, file_size)
-        )
-        conn.commit()
-        conn.close()
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO user_files (id, user_id, filename, original_filename, file_size) "
+                    "VALUES (:id, :user_id, :filename, :original_filename, :file_size)"
+                ),
+                {
+                    "id": file_id,
+                    "user_id": user_id,
+                    "filename": new_filename,
+                    "original_filename": file.filename,
+                    "file_size": file_size,
+                }
+            )
         
         return {
             "id": file_id,
@@ -302,14 +302,14 @@ def save_uploaded_file(file: UploadFile, user_id: str) -> Optional[dict]:
 
 def get_user_files(user_id: str) -> List[dict]:
     """Получает список файлов пользователя"""
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, filename, original_filename, file_size, upload_date FROM user_files WHERE user_id = ? ORDER BY upload_date DESC", 
-        (user_id,)
-    )
-    files = cursor.fetchall()
-    conn.close()
+    with engine.connect() as conn:
+        files = conn.execute(
+            text(
+                "SELECT id, filename, original_filename, file_size, upload_date FROM user_files "
+                "WHERE user_id = :user_id ORDER BY upload_date DESC"
+            ),
+            {"user_id": user_id}
+        ).fetchall()
     
     result = []
     for file in files:
@@ -318,36 +318,69 @@ def get_user_files(user_id: str) -> List[dict]:
             "filename": file[1],
             "original_filename": file[2],
             "file_size": file[3],
-            "upload_date": file[4]
+            # PostgreSQL возвращает datetime, SQLite — строку
+            "upload_date": str(file[4])
         })
     
     return result
 
 def delete_user_file(file_id: str, user_id: str) -> bool:
     """Удаляет файл пользователя"""
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-    
-    # Проверяем, что файл принадлежит пользователю
-    cursor.execute("SELECT filename FROM user_files WHERE id = ? AND user_id = ?", (file_id, user_id))
-    file = cursor.fetchone()
-    
-    if not file:
-        conn.close()
-        return False
+    with engine.begin() as conn:
+        # Проверяем, что файл принадлежит пользователю
+        file = conn.execute(
+            text("SELECT filename FROM user_files WHERE id = :file_id AND user_id = :user_id"),
+            {"file_id": file_id, "user_id": user_id}
+        ).fetchone()
+        
+        if not file:
+            return False
+        
+        # Удаляем запись из БД
+        had_mapping = delete_mapping(conn, file_id)
+        conn.execute(text("DELETE FROM file_pages WHERE file_id = :file_id"), {"file_id": file_id})
+        job_params = conn.execute(
+            text("DELETE FROM jobs WHERE file_id = :file_id RETURNING params"), {"file_id": file_id}
+        ).scalars().all()
+        conn.execute(text("DELETE FROM user_files WHERE id = :file_id"), {"file_id": file_id})
+        if had_mapping:
+            record_changes(conn, user_id, "mapping", [file_id], deleted=True)
     
-    # Удаляем файл с диска
+    # Удаляем файл и исходные тексты его задач с диска
+    for params in job_params:
+        remove_job_inputs(json.loads(params))
     file_path = UPLOAD_DIR / file[0]
     if os.path.exists(file_path):
         os.remove(file_path)
     
-    # Удаляем запись из БД
-    cursor.execute("DELETE FROM user_files WHERE id = ?", (file_id,))
-    conn.commit()
-    conn.close()
-    
     return True
 
+# Лента изменений для синхронизации клиентов: словарь и сопоставления книг
+CHANGE_ENTITIES = ("dictionary", "mapping")
+SYNC_PAGE_MAX = 5000
+
+def record_changes(conn, user_id: str, entity: str, keys: List[str], deleted: bool = False) -> int:
+    """
+    Отмечает изменение сущностей в той же транзакции, что и сами данные.
+    Счётчик пользователя увеличивается upsert-ом, который блокирует его строку
+    до коммита, поэтому номера изменений одного пользователя фиксируются по порядку.
+    """
+    seq = conn.execute(text("""
+        INSERT INTO change_sequences (user_id, seq) VALUES (:user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET seq = change_sequences.seq + 1
+        RETURNING seq
+    """), {"user_id": user_id}).scalar_one()
+    conn.execute(text("""
+        INSERT INTO change_log (user_id, entity, entity_key, seq, deleted)
+        VALUES (:user_id, :entity, :entity_key, :seq, :deleted)
+        ON CONFLICT (user_id, entity, entity_key) DO UPDATE
+        SET seq = excluded.seq, deleted = excluded.deleted
+    """), [
+        {"user_id": user_id, "entity": entity, "entity_key": key, "seq": seq, "deleted": deleted}
+        for key in dict.fromkeys(keys)
+    ])
+    return seq
+
 # API маршруты
 @app.post("/api/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -408,48 +441,43 @@ async def delete_file(file_id: str, current_user = Depends(get_current_active_us
     success = delete_user_file(file_id, current_user["id"])
     if not success:
         raise HTTPException(status_code=404, detail="File not found or permission denied")
+    translation_memory.remove(current_user["id"], f"file:{file_id}")
+    prefetch_scheduler.cancel_user(current_user["id"])
     return {"status": "success", "message": "File deleted successfully"}
 
+# Ограничиваем длину текста для стабильности
+MAX_TRANSLATION_LENGTH = 8000
+
 # Класс для запроса перевода
 class TranslationRequest(BaseModel):
     text: str
     source_lang: str = Field(default="en")
     target_lang: str = Field(default="ru")
+    # Откуда текст: по ним сервер заранее переводит следующие страницы
+    file_id: Optional[str] = None
+    page: Optional[int] = Field(default=None, ge=1)
+
+# Класс для передачи текста страниц файла (нумерация с start_page)
+class FilePagesRequest(BaseModel):
+    start_page: int = Field(default=1, ge=1)
+    pages: List[str]
+
+# Класс для пакетного запроса перевода
+class TranslationBatchRequest(BaseModel):
+    segments: List[TranslationRequest]
+
+# Бэкенд внешнего перевода с общим пулом HTTP-соединений
+translator_backend = create_backend(settings.TRANSLATION_BACKEND)
 
-# Функция для перевода через DeepTranslator
+# Функция для перевода через внешний сервис
 def deep_translate(text, source_lang="en", target_lang="ru"):
     """
-    Использует библиотеку deep-translator для перевода текста
+    Переводит один кусок текста (не длиннее лимита API) через настроенный бэкенд.
+    Разбиение, кэш и запасной словарь обеспечивает TranslationService.
     """
     if not text or text.strip() == "":
         return ""
-        
-    try:
-        # Ограничение длины для API
-        chunk_size = 4500
-        
-        # Делим текст на части, если он слишком длинный
-        if len(text) > chunk_size:
-            chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-            translated_chunks = []
-            
-            # Переводим каждый кусок отдельно
-            for chunk in chunks:
-                translator = GoogleTranslator(source=source_lang, target=target_lang)
-                translated = translator.translate(chunk)
-                translated_chunks.append(translated)
-            
-            # Объединяем переведенные куски
-            return " ".join(translated_chunks)
-        else:
-            # Если текст достаточно короткий, переводим целиком
-            translator = GoogleTranslator(source=source_lang, target=target_lang)
-            return translator.translate(text)
-            
-    except Exception as e:
-        logging.error(f"DeepTranslator error: {str(e)}")
-        # Если возникла ошибка, используем локальный словарь
-        return simple_translate(text)
+    return translator_backend.translate(text, source_lang, target_lang)
 
 # API для перевода текста
 @app.post("/api/translate")
@@ -459,195 +487,273 @@ async def translate_text(
 ):
     try:
         # Ограничиваем длину текста для стабильности
-        max_length = 8000
+        max_length = MAX_TRANSLATION_LENGTH
         text = request.text
         
         if len(text) > max_length:
             logging.warning(f"Text too long: {len(text)} chars, truncating to {max_length}")
             text = text[:max_length]
             
-        # Используем DeepTranslator для перевода
-        translated_text = deep_translate(
+        # Переводим через DeepTranslator: куски уходят в пул потоков параллельно,
+        # чтобы блокирующий HTTP не останавливал event loop
+        translated_text, from_upstream = await translation_service.translate_with_status(
             text,
             source_lang=request.source_lang,
-            target_lang=request.target_lang
+            target_lang=request.target_lang,
+            user_id=current_user["id"]
         )
         
         # Проверяем результат
         if not translated_text:
             raise HTTPException(status_code=500, detail="Empty translation result")
             
-        return {"translated_text": translated_text}
+        if request.file_id and request.page:
+            await remember_page_and_prefetch(current_user["id"], request, text)
+
+        # degraded: перевод выполнен запасным словарём, а не внешним сервисом
+        return {"translated_text": translated_text, "degraded": not from_upstream}
+    except HTTPException:
+        raise
+    except TranslationOverloaded as e:
+        logging.warning(f"Translation rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Translation service is busy, try again later")
+    except TranslationTimeout as e:
+        logging.warning(f"Translation deadline exceeded: {str(e)}")
+        raise HTTPException(status_code=504, detail="Translation timed out")
     except Exception as e:
         logging.error(f"Translation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
 
+# API для пакетного перевода: страница и отдельные слова за один запрос
+@app.post("/api/translate/batch")
+async def translate_batch(
+    request: TranslationBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    if len(request.segments) > settings.TRANSLATION_BATCH_MAX_SEGMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many segments: {len(request.segments)}, maximum is {settings.TRANSLATION_BATCH_MAX_SEGMENTS}"
+        )
+
+    segments = [
+        (segment.text[:MAX_TRANSLATION_LENGTH], segment.source_lang, segment.target_lang)
+        for segment in request.segments
+    ]
+    try:
+        results = await translation_service.translate_batch(segments, user_id=current_user["id"])
+    except Exception as e:
+        logging.error(f"Batch translation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
+
+    return {"results": [dict(result, index=index) for index, result in enumerate(results)]}
+
+# API для потокового перевода: куски отдаются по мере готовности
+@app.post("/api/translate/stream")
+async def translate_stream(
+    request: TranslationRequest,
+    format: str = Query(default="ndjson", pattern="^(ndjson|sse)$"),
+    current_user: User = Depends(get_current_user)
+):
+    text = request.text[:MAX_TRANSLATION_LENGTH]
+    user_id = current_user["id"]
+
+    async def ndjson_events():
+        async for message in translation_service.translate_stream(text, request.source_lang, request.target_lang, user_id):
+            yield json.dumps(message, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+
+    async def sse_events():
+        async for message in translation_service.translate_stream(text, request.source_lang, request.target_lang, user_id):
+            yield f"id: {message['seq']}\nevent: chunk\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+@app.get("/api/translate/stats")
+async def translation_stats(current_user: User = Depends(get_current_user)):
+    """Счётчики кэша переводов, пулов бэкендов, объединения запросов и предохранителя"""
+    return {
+        "cache": translation_cache.stats(),
+        "executors": translation_executors.stats(),
+        "single_flight": translation_service.single_flight.stats(),
+        "upstream": translation_service.stats(),
+        "memory": translation_memory.stats(),
+        "prefetch": prefetch_scheduler.stats(),
+    }
+
+# Офлайн-переводчики по парам языков поверх словарей, открытых через mmap
+_offline_translators = {}
+
+def get_offline_translator(source_lang, target_lang) -> Optional[OfflineTranslator]:
+    pair = (source_lang, target_lang)
+    if pair not in _offline_translators:
+        dictionary = dictionary_registry.get(source_lang, target_lang)
+        _offline_translators[pair] = OfflineTranslator(
+            dictionary, CLEANUP_RULES.get(target_lang, ())
+        ) if dictionary is not None else None
+    return _offline_translators[pair]
+
 # Оставляем словарный метод как последний запасной вариант
-def simple_translate(text):
+def simple_translate(text, source_lang="en", target_lang="ru"):
     try:
-        logging.info(f"Translating text: {text}")
-        
-        # Если текст пустой, вернуть пустую строку
-        if not text or text.strip() == "":
-            return ""
-            
-        # Разбиваем текст на слова, сохраняя пунктуацию
-        words_with_punct = re.findall(r'[\w\']+|[.,!?;:()]', text)
-        
-        translated_words = []
-        
-        for word in words_with_punct:
-            # Игнорируем пунктуацию
-            if re.match(r'^[.,!?;:()]$', word):
-                translated_words.append(word)
-                continue
-                
-            # Сохраняем оригинальный регистр слова
-            original_word = word
-            word_lower = word.lower()
-            
-            # Проверяем, есть ли слово в словаре
-            if word_lower in TRANSLATION_DICT:
-                translation = TRANSLATION_DICT[word_lower]
-                
-                # Если перевод пустой (например, для артиклей)
-                if not translation:
-                    continue
-                    
-                # Сохраняем оригинальный регистр
-                if original_word.istitle() and translation:
-                    translation = translation.capitalize()
-                elif original_word.isupper() and translation:
-                    translation = translation.upper()
-                    
-                translated_words.append(translation)
-            else:
-                # Если слово не найдено в словаре, оставляем его как есть
-                translated_words.append(original_word)
-                
-        # Объединяем слова обратно в текст
-        translated_text = ' '.join(translated_words)
-        
-        # Дополнительная очистка текста для лучшей читаемости
-        # 1. Убираем пробелы перед знаками препинания
-        translated_text = re.sub(r'\s+([.,!?;:])', r'\1', translated_text)
-        
-        # 2. Добавляем пробелы после знаков препинания, если за ними следует буква
-        translated_text = re.sub(r'([.,!?;:])([а-яА-Яa-zA-Z])', r'\1 \2', translated_text)
-        
-        # 3. Исправляем двойные пробелы
-        translated_text = re.sub(r'\s{2,}', ' ', translated_text)
-        
-        # 4. Правильное использование дефисов
-        translated_text = re.sub(r'\s-\s', '-', translated_text)
-        
-        # 5. Правила для русского языка
-        clean_patterns = [
-            # Убираем "и" в начале предложения
-            (r'^\s*И\s+', ''),
-            (r'^\s*и\s+', ''),
-            # Убираем ошибочные конструкции
-            (r'\sявляется\s+был', ' был'),
-            (r'\sявляется\s+были', ' были'),
-            # Исправляем предлоги
-            (r'\sв\s+в\s', ' в '),
-            (r'\sна\s+на\s', ' на '),
-            # Исправляем местоимения
-            (r'\sего его\s', ' его '),
-            (r'\sих их\s', ' их '),
-        ]
-        
-        for pattern, replacement in clean_patterns:
-            translated_text = re.sub(pattern, replacement, translated_text)
-            
-        logging.info(f"Translation result: {translated_text}")
+        translator = get_offline_translator(source_lang, target_lang)
+        if translator is None:
+            logging.warning(f"No offline dictionary for {source_lang}-{target_lang}")
+            return text
+        logging.debug(f"Translating text offline: {text}")
+        translated_text = translator.translate(text)
+        logging.debug(f"Translation result: {translated_text}")
         return translated_text
     except Exception as e:
         logging.error(f"Translation error: {str(e)}")
         # В случае ошибки возвращаем исходный текст
         return text
 
-# Словарь для перевода - расширенный набор слов, особенно характерных для "Острова сокровищ"
-TRANSLATION_DICT = {
-    # Общие слова
-    "the": "", "a": "", "an": "", "is": "является", "are": "являются", "was": "был", "were": "были",
-    "am": "являюсь", "be": "быть", "been": "был", "will": "будет", "would": "бы", "should": "следует",
-    "can": "может", "could": "мог бы", "may": "может", "might": "мог бы", "must": "должен",
-    "have": "иметь", "has": "имеет", "had": "имел", "do": "делать", "does": "делает", "did": "делал",
-    "in": "в", "on": "на", "at": "на", "by": "у", "with": "с", "from": "из", "of": "из", "to": "к",
-    "for": "для", "about": "о", "against": "против", "between": "между", "into": "в", "through": "через",
-    "during": "во время", "before": "перед", "after": "после", "above": "над", "below": "под",
-    "up": "вверх", "down": "вниз", "out": "вне", "off": "от", "over": "над", "under": "под", "again": "снова",
-    "further": "далее", "then": "затем", "once": "однажды", "here": "здесь", "there": "там", "when": "когда",
-    "where": "где", "why": "почему", "how": "как", "all": "все", "any": "любой", "both": "оба", "each": "каждый",
-    "few": "несколько", "more": "больше", "most": "большинство", "other": "другой", "some": "некоторые",
-    "such": "такой", "no": "нет", "nor": "ни", "not": "не", "only": "только", "own": "собственный",
-    "same": "тот же", "so": "так", "than": "чем", "too": "тоже", "very": "очень", "this": "это",
-    "that": "то", "i": "я", "me": "меня", "my": "мой", "myself": "себя", "we": "мы", "our": "наш", "ours": "наш",
-    "ourselves": "себя", "you": "ты", "your": "твой", "yours": "твой", "yourself": "себя", "yourselves": "себя",
-    "he": "он", "him": "его", "his": "его", "himself": "себя", "she": "она", "her": "её", "hers": "её",
-    "herself": "себя", "it": "это", "its": "его", "itself": "себя", "they": "они", "them": "их", "their": "их",
-    "theirs": "их", "themselves": "себя", "what": "что", "which": "который", "who": "кто", "whom": "кого",
-    "whose": "чей", "and": "и", "but": "но", "if": "если", "or": "или", "because": "потому что",
-    "as": "как", "until": "до", "while": "пока", "said": "сказал", "one": "один", "two": "два", "three": "три",
-    
-    # Персонажи из Острова Сокровищ
-    "jim": "Джим", "hawkins": "Хокинс", "trelawney": "Трелони", "squire": "сквайр",
-    "doctor": "доктор", "livesey": "Ливси", "smollett": "Смоллетт", "captain": "капитан",
-    "flint": "Флинт", "silver": "Сильвер", "john": "Джон", "long": "Долговязый", "ben": "Бен",
-    "gunn": "Ганн", "black": "Чёрный", "dog": "Пёс", "blind": "слепой", "pew": "Пью",
-    "israel": "Израэль", "hands": "Хендс", "billy": "Билли", "bones": "Бонс", "george": "Джордж",
-    "merry": "Мерри", "tom": "Том", "morgan": "Морган", "dirk": "Дёрк", "joyce": "Джойс",
-    "o'brien": "О'Брайен", "redruth": "Редрут", "blandly": "Блендли", "arrow": "Эрроу",
-    
-    # Морская терминология и термины из книги
-    "sea": "море", "sailor": "моряк", "ship": "корабль", "boat": "лодка", "deck": "палуба",
-    "mast": "мачта", "sail": "парус", "cabin": "каюта", "mate": "помощник", "crew": "команда",
-    "pirate": "пират", "treasure": "сокровище", "map": "карта", "island": "остров", "beach": "пляж",
-    "shore": "берег", "coast": "побережье", "water": "вода", "wave": "волна", "tide": "прилив",
-    "port": "порт", "harbor": "гавань", "inn": "таверна", "rum": "ром", "chest": "сундук",
-    "gold": "золото", "silver": "серебро", "coin": "монета", "cutlass": "абордажная сабля",
-    "sword": "меч", "pistol": "пистолет", "gun": "ружье", "musket": "мушкет", "shot": "выстрел",
-    "powder": "порох", "adventure": "приключение", "stockade": "частокол", "parrot": "попугай",
-    "pieces of eight": "пиастры", "schooner": "шхуна", "rigging": "такелаж", "mutiny": "мятеж",
-    "spy-glass": "подзорная труба", "anchor": "якорь", "voyage": "путешествие", "course": "курс",
-    "wheel": "штурвал", "journal": "журнал", "log": "журнал", "buccaneers": "буканьеры",
-    "hispaniola": "Испаньола", "jolly roger": "Весёлый Роджер", "maroon": "высадить на необитаемый остров",
-    "black spot": "черная метка", "skeleton": "скелет", "compass": "компас", "cove": "бухта",
-    "spyglass": "подзорная труба", "sail": "парус", "plunder": "добыча", "booty": "награбленное",
-    
-    # Дополнительные распространённые слова
-    "good": "хороший", "bad": "плохой", "man": "человек", "woman": "женщина", "boy": "мальчик",
-    "girl": "девочка", "child": "ребенок", "children": "дети", "friend": "друг", "enemy": "враг",
-    "time": "время", "year": "год", "day": "день", "night": "ночь", "life": "жизнь", "world": "мир",
-    "way": "путь", "thing": "вещь", "part": "часть", "place": "место", "case": "случай", "group": "группа",
-    "company": "компания", "number": "число", "work": "работа", "point": "точка", "government": "правительство",
-    "country": "страна", "city": "город", "house": "дом", "room": "комната", "area": "область",
-    "issue": "проблема", "side": "сторона", "business": "бизнес", "school": "школа", "family": "семья",
-    "word": "слово", "eye": "глаз", "head": "голова", "hand": "рука", "foot": "нога", "face": "лицо",
-    "body": "тело", "heart": "сердце", "mind": "разум", "look": "смотреть", "see": "видеть", "find": "находить",
-    "tell": "рассказывать", "ask": "спрашивать", "give": "давать", "take": "брать", "come": "приходить",
-    "go": "идти", "get": "получать", "make": "делать", "know": "знать", "think": "думать", "want": "хотеть",
-    "need": "нуждаться", "seem": "казаться", "feel": "чувствовать", "try": "пытаться", "leave": "уходить",
-    "call": "звонить", "work": "работать", "move": "двигаться", "live": "жить", "believe": "верить",
-    "hold": "держать", "bring": "приносить", "happen": "случаться", "write": "писать", "read": "читать",
-    "sit": "сидеть", "stand": "стоять", "hear": "слышать", "walk": "ходить", "run": "бежать",
-    "like": "нравиться", "love": "любить", "hate": "ненавидеть", "say": "говорить", "talk": "разговаривать",
-    "eat": "есть", "drink": "пить", "sleep": "спать", "play": "играть", "small": "маленький",
-    "large": "большой", "old": "старый", "young": "молодой", "new": "новый", "right": "правильный",
-    "wrong": "неправильный", "high": "высокий", "low": "низкий", "early": "ранний", "late": "поздний",
-    "yes": "да", "maybe": "возможно", "perhaps": "возможно", "always": "всегда", "never": "никогда",
-    "sometimes": "иногда", "often": "часто", "really": "действительно", "actually": "на самом деле",
-    "well": "хорошо", "great": "отлично", "pretty": "довольно", "little": "мало", "lot": "много",
-    "first": "первый", "last": "последний", "next": "следующий", "same": "такой же",
-}
+# Конвейер перевода: внешний сервис с запасным словарём
+translation_service = TranslationService(
+    upstream=deep_translate,
+    fallback=simple_translate,
+    backend=translator_backend.name,
+)
+
+# Текст страниц файлов для упреждающего перевода
+def save_file_pages(file_id: str, user_id: str, start_page: int, pages: List[str]) -> bool:
+    """Сохраняет текст страниц, если файл принадлежит пользователю"""
+    with engine.begin() as conn:
+        owned = conn.execute(
+            text("SELECT 1 FROM user_files WHERE id = :file_id AND user_id = :user_id"),
+            {"file_id": file_id, "user_id": user_id}
+        ).fetchone()
+        if not owned:
+            return False
+        # Храним ровно тот текст, что уходит в перевод, чтобы совпадали ключи кэша
+        conn.execute(
+            text(
+                "INSERT INTO file_pages (file_id, page, text) VALUES (:file_id, :page, :text) "
+                "ON CONFLICT (file_id, page) DO UPDATE SET text = excluded.text"
+            ),
+            [
+                {"file_id": file_id, "page": start_page + i, "text": page_text[:MAX_TRANSLATION_LENGTH]}
+                for i, page_text in enumerate(pages)
+            ]
+        )
+        return True
+
+def get_file_page_text(file_id: str, page: int) -> Optional[str]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT text FROM file_pages WHERE file_id = :file_id AND page = :page"),
+            {"file_id": file_id, "page": page}
+        ).fetchone()
+        return row[0] if row else None
+
+# Фоновый прогрев кэша не занимает пул бэкенда, когда все его потоки уже работают
+prefetch_scheduler = PrefetchScheduler(
+    translate=translation_service.warm,
+    load_page=get_file_page_text,
+    is_busy=lambda: translation_executors.get(translator_backend.name).saturated(),
+)
+
+async def remember_page_and_prefetch(user_id: str, request: TranslationRequest, text: str):
+    """Запоминает текст переведённой страницы и ставит в очередь следующие"""
+    try:
+        owned = await asyncio.to_thread(save_file_pages, request.file_id, user_id, request.page, [text])
+    except Exception as e:
+        logger.error(f"Error saving page text: {e}")
+        return
+    if owned:
+        prefetch_scheduler.schedule(user_id, request.file_id, request.page, request.source_lang, request.target_lang)
+
+@app.put("/api/files/{file_id}/pages")
+async def upload_file_pages(
+    file_id: str,
+    request_data: FilePagesRequest,
+    current_user = Depends(get_current_active_user)
+):
+    """Текст страниц PDF, извлечённый клиентом, для перевода страниц наперёд"""
+    if not await asyncio.to_thread(save_file_pages, file_id, current_user["id"], request_data.start_page, request_data.pages):
+        raise HTTPException(status_code=404, detail="File not found or permission denied")
+    return {"status": "success", "pages": len(request_data.pages)}
+
+# Память переводов: выровненные абзацы подготовленных книг и слова из словарей
+# Бусины с такой уверенностью выравнивания, скорее всего, сопоставлены неверно
+MEMORY_MIN_ALIGNMENT_CONFIDENCE = 0.01
+
+def book_memory_items(file_id, user_id, paragraphs):
+    origin = f"file:{file_id}"
+    for para in paragraphs:
+        # Непарные абзацы и ненадёжные бусины в память не попадают
+        if not para["english"] or not para["russian"]:
+            continue
+        if para.get("confidence", 1.0) < MEMORY_MIN_ALIGNMENT_CONFIDENCE:
+            continue
+        yield MemoryItem(origin, user_id, para["english"], para["russian"], "en", "ru")
+        yield MemoryItem(origin, user_id, para["russian"], para["english"], "ru", "en")
+
+def dictionary_memory_items(user_id, values):
+    """Слово словаря для памяти переводов — только если известно, с какого языка на какой"""
+    if not values.get("source_lang") or not values.get("target_lang"):
+        return []
+    return [MemoryItem(
+        f"dict:{user_id}:{values['word']}", user_id, values["word"], values["translation"],
+        values["source_lang"], values["target_lang"], fuzzy=False
+    )]
+
+def load_translation_memory(user_id: str):
+    """Записи памяти одного пользователя: его подготовленные книги и слова словаря"""
+    # Снимок буфера берётся до чтения базы: слово, записанное между ними, найдётся в базе
+    pending = dictionary_write_behind.pending(user_id) if dictionary_write_behind is not None else {}
+    with engine.connect() as conn:
+        books = conn.execute(text("""
+            SELECT m.file_id FROM files_with_mapping m
+            JOIN user_files f ON f.id = m.file_id
+            WHERE f.user_id = :user_id
+        """), {"user_id": user_id}).fetchall()
+        for (file_id,) in books:
+            try:
+                yield from book_memory_items(file_id, user_id, iter_mapping_paragraphs(conn, file_id))
+            except (ValueError, KeyError, AttributeError) as e:
+                logger.error(f"Skipping broken mapping for file {file_id}: {e}")
+        for row in conn.execute(text("""
+            SELECT word, translation, source_lang, target_lang FROM user_dictionary
+            WHERE user_id = :user_id AND source_lang IS NOT NULL AND target_lang IS NOT NULL
+        """), {"user_id": user_id}):
+            if row.word not in pending:
+                yield from dictionary_memory_items(user_id, row._mapping)
+    for values in pending.values():
+        yield from dictionary_memory_items(user_id, values)
+
+translation_memory.loader = load_translation_memory
+
+async def purge_translation_cache():
+    """Удаляет просроченные переводы из SQLite-уровня кэша: при старте и затем периодически"""
+    while True:
+        removed = await asyncio.to_thread(translation_cache.purge_expired)
+        if removed:
+            logger.info(f"Purged {removed} expired translations from cache")
+        await asyncio.sleep(settings.TRANSLATION_CACHE_PURGE_INTERVAL)
 
 # Инициализация приложения
 @app.on_event("startup")
 async def startup():
     init_db()
+    app.state.cache_purge = asyncio.create_task(purge_translation_cache())
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.cache_purge.cancel()
+    await job_queue.shutdown()
+    if dictionary_write_behind is not None:
+        await dictionary_write_behind.close()
+    prefetch_scheduler.shutdown()
+    translation_executors.shutdown()
+    translator_backend.close()
 
-@app.post("/api/prepare-book")
+@app.post("/api/prepare-book", status_code=status.HTTP_202_ACCEPTED)
 async def prepare_book(
     request_data: PrepareBookRequest,  # Используем Pydantic модель
     current_user: User = Depends(get_current_user) # Используем стандартную зависимость
@@ -662,139 +768,349 @@ async def prepare_book(
     if not file_id or not english_text or not russian_text:
         raise HTTPException(status_code=400, detail="Отсутствуют необходимые данные: file_id, english_text, russian_text")
 
-    # Проверяем, что файл принадлежит пользователю
-    conn = sqlite3.connect('app.db')
-    c = conn.cursor()
+    check_file_owner(file_id, current_user["id"])
+
+    # Выравнивание и запись делает фоновая задача; тексты ждут её на диске
+    job_id, params = new_prepare_book_job()
+    await asyncio.to_thread(Path(params["english_path"]).write_text, english_text, encoding="utf-8")
+    await asyncio.to_thread(Path(params["russian_path"]).write_text, russian_text, encoding="utf-8")
+    return submit_prepare_book_job(job_id, params, current_user["id"], file_id)
+
+@app.post("/api/prepare-book/upload", status_code=status.HTTP_202_ACCEPTED)
+async def prepare_book_upload(
+    file_id: str = Form(...),
+    english: UploadFile = File(...),
+    russian: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Подготовка книги по текстам, загруженным файлами (UTF-8, можно сжать gzip).
+    Тексты копируются на диск кусками и целиком в память не читаются.
+    """
+    check_file_owner(file_id, current_user["id"])
 
-    # Используем current_user["id"]
-    c.execute("SELECT id FROM user_files WHERE id = ? AND user_id = ?", (file_id, current_user["id"]))
-    file = c.fetchone()
+    job_id, params = new_prepare_book_job()
+    try:
+        sizes = [
+            await asyncio.to_thread(save_stream, english.file, params["english_path"]),
+            await asyncio.to_thread(save_stream, russian.file, params["russian_path"]),
+        ]
+    except OSError as e:
+        remove_job_inputs(params)
+        raise HTTPException(status_code=500, detail=f"Ошибка сохранения текстов: {str(e)}")
+    if not all(sizes):
+        remove_job_inputs(params)
+        raise HTTPException(status_code=400, detail="Отсутствуют необходимые данные: english, russian")
+    return submit_prepare_book_job(job_id, params, current_user["id"], file_id)
 
+def check_file_owner(file_id: str, user_id: str):
+    with engine.connect() as conn:
+        file = conn.execute(
+            text("SELECT id FROM user_files WHERE id = :file_id AND user_id = :user_id"),
+            {"file_id": file_id, "user_id": user_id}
+        ).fetchone()
     if not file:
-        conn.close()
         raise HTTPException(status_code=404, detail="Файл не найден или у вас нет прав доступа к нему")
 
-    # Создаем сопоставление между английским и русским текстом
-    # Разбиваем текст на предложения и параграфы
-    english_paragraphs = [p.strip() for p in english_text.split('\n\n') if p.strip()]
-    russian_paragraphs = [p.strip() for p in russian_text.split('\n\n') if p.strip()]
-    
-    # Простой алгоритм сопоставления по порядку параграфов
-    mapping = {}
-    
-    # Если разное количество параграфов, сопоставляем до минимального
-    min_paragraphs = min(len(english_paragraphs), len(russian_paragraphs))
-    
-    for i in range(min_paragraphs):
-        eng_para = english_paragraphs[i]
-        rus_para = russian_paragraphs[i]
-        
-        # Словарь для каждого параграфа
-        para_mapping = {
-            "english": eng_para,
-            "russian": rus_para
-        }
-        
-        # Добавляем в общий словарь сопоставлений
-        mapping[i] = para_mapping
-    
-    # Конвертируем словарь в JSON
-    mapping_json = json.dumps(mapping, ensure_ascii=False)
-    
-    # Сохраняем сопоставление в базу данных
+def new_prepare_book_job():
+    """Номер новой задачи и пути к её исходным текстам (простой текст или gzip)"""
+    job_id = str(uuid.uuid4())
+    return job_id, {
+        "english_path": str(JOBS_DIR / f"{job_id}.en"),
+        "russian_path": str(JOBS_DIR / f"{job_id}.ru"),
+    }
+
+def submit_prepare_book_job(job_id: str, params: dict, user_id: str, file_id: str) -> dict:
     try:
-        # Проверяем, существует ли уже сопоставление для этого файла
-        c.execute("SELECT id FROM files_with_mapping WHERE file_id = ?", (file_id,))
-        existing_mapping = c.fetchone()
-        
-        if existing_mapping:
-            # Обновляем существующее сопоставление
-            c.execute("UPDATE files_with_mapping SET mapping_data = ?, created_at = CURRENT_TIMESTAMP WHERE file_id = ?", 
-                      (mapping_json, file_id))
-        else:
-            # Создаем новое сопоставление
-            c.execute("INSERT INTO files_with_mapping (file_id, mapping_data) VALUES (?, ?)",
-                      (file_id, mapping_json))
-        
-        conn.commit()
+        with engine.begin() as conn:
+            job_queue.submit(conn, "prepare-book", user_id, file_id, params, job_id=job_id)
     except Exception as e:
-        conn.rollback()
-        conn.close()
-        raise HTTPException(status_code=500, detail=f"Ошибка сохранения сопоставления: {str(e)}")
-    
-    conn.close()
-    
-    return {"success": True, "message": "Книга успешно подготовлена"}
+        remove_job_inputs(params)
+        raise HTTPException(status_code=500, detail=f"Ошибка постановки задачи: {str(e)}")
+    job_queue.wake()
+    return {"success": True, "job_id": job_id, "status": "queued", "message": "Подготовка книги поставлена в очередь"}
+
+def remove_job_inputs(params: dict):
+    for key in ("english_path", "russian_path"):
+        try:
+            os.remove(params[key])
+        except FileNotFoundError:
+            pass
+
+def run_prepare_book_job(job: dict, report) -> dict:
+    """
+    Фоновая подготовка книги в два прохода по текстам: сначала только длины абзацев
+    для выравнивания, затем сами абзацы, которые по бусинам сразу уходят в сегменты
+    сопоставления. Целиком книга в памяти не держится.
+    """
+    file_id, user_id, params = job["file_id"], job["user_id"], job["params"]
+    english_path, russian_path = params["english_path"], params["russian_path"]
+    report(0.0, "split")
+    try:
+        english_lengths = paragraph_lengths(english_path)
+        russian_lengths = paragraph_lengths(russian_path)
+    except FileNotFoundError:
+        raise ValueError("Исходные тексты задачи не найдены")
+
+    report(0.1, "align")
+    beads = align(english_lengths, russian_lengths, progress=lambda share: report(0.1 + 0.7 * share, "align"))
+
+    # Сохраняем сопоставление в базу данных сегментами по MAPPING_SEGMENT_SIZE абзацев
+    report(0.8, "save")
+    mapping = iter_bead_mapping(beads, iter_paragraphs(english_path), iter_paragraphs(russian_path))
+    with engine.begin() as conn:
+        owned = conn.execute(
+            text("SELECT 1 FROM user_files WHERE id = :file_id AND user_id = :user_id"),
+            {"file_id": file_id, "user_id": user_id}
+        ).fetchone()
+        if not owned:
+            raise ValueError("Файл удалён до завершения подготовки")
+        # Задачу могли вернуть в очередь (остановка процесса, потеря отметок живости):
+        # тогда результат запишет её повторный запуск, а этот поток не пишет ничего
+        if not hold_claim(conn, job):
+            raise ValueError("Задача уже передана другому воркеру")
+        version = save_mapping(conn, file_id, mapping)
+        record_changes(conn, user_id, "mapping", [file_id])
+
+    # Абзацы книги сразу становятся доступны памяти переводов
+    with engine.connect() as conn:
+        translation_memory.replace(
+            user_id, f"file:{file_id}", book_memory_items(file_id, user_id, iter_mapping_paragraphs(conn, file_id))
+        )
+    return {"paragraphs": len(beads), "version": version}
+
+# Фоновые задачи: воркеры забирают их из таблицы jobs
+job_queue = JobQueue(
+    {"prepare-book": run_prepare_book_job},
+    # Тексты нужны до завершения задачи: при повторе после перезапуска они читаются снова
+    cleanup=lambda job: remove_job_inputs(job["params"]),
+)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Состояние фоновой задачи: status (queued, running, done, failed), progress, stage и результат"""
+    job = await asyncio.to_thread(job_queue.get, job_id, current_user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+def get_owned_file_id(conn, filename: str, user_id: str) -> str:
+    file = conn.execute(
+        text("SELECT id FROM user_files WHERE filename = :filename AND user_id = :user_id"),
+        {"filename": filename, "user_id": user_id}
+    ).fetchone()
+    if not file:
+        raise HTTPException(status_code=404, detail="Файл не найден или у вас нет прав доступа к нему")
+    return file[0]
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Есть ли кодировка в Accept-Encoding клиента (с q > 0)"""
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
 
 @app.get("/api/book-mapping/{filename}")
 async def get_book_mapping(
+    request: Request,
     filename: str,
+    start: Optional[int] = Query(default=None, alias="from", ge=0),
+    end: Optional[int] = Query(default=None, alias="to", ge=0),
     current_user: User = Depends(get_current_user) # Используем стандартную зависимость
 ):
-    # Удалены проверки токена из Cookie и получение user из токена
+    """
+    Сопоставление абзацев книги. С from/to — только абзацы с номерами из [from, to):
+    читаются лишь сегменты, в которые попадает диапазон.
+    """
+    with engine.connect() as conn:
+        file_id = get_owned_file_id(conn, filename, current_user["id"])
+        if start is None and end is None:
+            payload = load_mapping_payload(conn, file_id)
+            meta = load_mapping_meta(conn, file_id) if payload is None else None
+        else:
+            mapping = load_mapping_range(conn, file_id, start or 0, end if end is not None else 2 ** 31 - 1)
 
-    # Проверяем, что файл принадлежит пользователю
-    conn = sqlite3.connect('app.db')
-    c = conn.cursor()
+    if start is None and end is None:
+        if payload is None:
+            if not meta:
+                raise HTTPException(status_code=404, detail="Сопоставление для этого файла не найдено")
+            # Большая книга без сохранённого целиком JSON: отдаём сегменты потоком
+            return StreamingResponse(stream_mapping_json(file_id), media_type="application/json")
+        # Сохранённый JSON уходит без разбора; если клиент понимает сжатие, в котором он
+        # хранится, — и без распаковки
+        headers = {"Vary": "Accept-Encoding"}
+        encoding = blob_encoding(payload)
+        if encoding != "identity" and accepts_encoding(request.headers.get("accept-encoding"), encoding):
+            headers["Content-Encoding"] = encoding
+            return Response(content=blob_content(payload), media_type="application/json", headers=headers)
+        return Response(content=decode_blob(payload), media_type="application/json", headers=headers)
 
-    # Используем current_user["id"]
-    c.execute("SELECT id FROM user_files WHERE filename = ? AND user_id = ?", (filename, current_user["id"]))
-    file = c.fetchone()
+    if mapping is None:
+        raise HTTPException(status_code=404, detail="Сопоставление для этого файла не найдено")
+    return Response(content=dumps(mapping), media_type="application/json")
 
-    if not file:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Файл не найден или у вас нет прав доступа к нему")
+def stream_mapping_json(file_id: str):
+    with engine.connect() as conn:
+        yield from iter_mapping_json(conn, file_id)
+
+@app.get("/api/book-mapping/{filename}/meta")
+async def get_book_mapping_meta(
+    filename: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Число абзацев и версия сопоставления без самих абзацев"""
+    with engine.connect() as conn:
+        file_id = get_owned_file_id(conn, filename, current_user["id"])
+        meta = load_mapping_meta(conn, file_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Сопоставление для этого файла не найдено")
+    return meta
 
-    file_id = file[0]
+# Словарь пользователя: поля, которые можно запросить, и предельный размер страницы
+DICTIONARY_FIELDS = ("id", "word", "translation", "context", "source_lang", "target_lang", "created_at")
+DICTIONARY_PAGE_MAX = 1000
+# Код языка: латиница и дефис, как в "en", "pt-BR", "zh-Hans"; длина под String(8)
+LANGUAGE_CODE = re.compile(r"^[A-Za-z-]{2,8}$")
 
-    # Получаем сопоставление для файла
-    c.execute("SELECT mapping_data FROM files_with_mapping WHERE file_id = ?", (file_id,))
-    mapping_data = c.fetchone()
+# Добавление слова или обновление перевода и контекста, если слово уже есть
+UPSERT_DICTIONARY_WORD = text("""
+    INSERT INTO user_dictionary (user_id, word, translation, context, source_lang, target_lang)
+    VALUES (:user_id, :word, :translation, :context, :source_lang, :target_lang)
+    ON CONFLICT (user_id, word) DO UPDATE
+    SET translation = excluded.translation, context = excluded.context,
+        source_lang = excluded.source_lang, target_lang = excluded.target_lang
+""")
 
-    if not mapping_data:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Сопоставление для этого файла не найдено")
-    
-    conn.close()
+def dictionary_language_pair(values) -> dict:
+    """
+    Языки слова (source_lang, target_lang) из запроса: оба или ни одного.
+    Слово без пары языков хранится в словаре, но не отвечает в памяти переводов.
+    Неверный код — ValueError до записи, чтобы буфер не подтвердил строку,
+    которую база потом не примет.
+    """
+    pair = {}
+    for column in ("source_lang", "target_lang"):
+        value = values.get(column)
+        value = (str(value).strip() or None) if value is not None else None
+        if value is not None and not LANGUAGE_CODE.match(value):
+            raise ValueError(f"{column} must be a language code like 'en' or 'pt-BR'")
+        pair[column] = value
+    if (pair["source_lang"] is None) != (pair["target_lang"] is None):
+        raise ValueError("source_lang and target_lang must be given together")
+    return pair
+
+def bump_dictionary_version(conn, user_id: str):
+    """Увеличивает версию словаря в той же транзакции, что и само изменение"""
+    conn.execute(text("""
+        INSERT INTO dictionary_versions (user_id, version) VALUES (:user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = dictionary_versions.version + 1
+    """), {"user_id": user_id})
+    # Кэш слов всё равно сверяется с версией, сброс лишь освобождает память раньше
+    known_words_cache.invalidate(user_id)
+
+def get_dictionary_version(conn, user_id: str) -> int:
+    row = conn.execute(
+        text("SELECT version FROM dictionary_versions WHERE user_id = :user_id"), {"user_id": user_id}
+    ).fetchone()
+    return row[0] if row else 0
+
+def encode_dictionary_cursor(created_at, word_id: int) -> str:
+    raw = json.dumps([str(created_at), word_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-    # Парсим JSON-данные из БД
-    mapping = json.loads(mapping_data[0])
+def decode_dictionary_cursor(cursor: str):
+    try:
+        created_at, word_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), int(word_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_dictionary_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(DICTIONARY_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in DICTIONARY_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; available: {', '.join(DICTIONARY_FIELDS)}")
+    return selected
 
-    return mapping
+def query_dictionary(conn, user_id: str, fields: List[str], cursor: Optional[str], limit: Optional[int]):
+    """
+    Слова от новых к старым. Курсор — (created_at, id) последней отданной строки:
+    следующая страница читается по индексу с этого места, без OFFSET.
+    """
+    # Имена колонок берутся только из DICTIONARY_FIELDS
+    columns = ", ".join(dict.fromkeys(["id", "created_at", *fields]))
+    sql = f"SELECT {columns} FROM user_dictionary WHERE user_id = :user_id"
+    params = {"user_id": user_id}
+    if cursor:
+        params["created_at"], params["id"] = decode_dictionary_cursor(cursor)
+        sql += " AND (created_at < :created_at OR (created_at = :created_at AND id < :id))"
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return conn.execute(text(sql), params)
+
+def dictionary_entry(row, fields: List[str]) -> dict:
+    values = row._mapping
+    return {
+        field: values[field] if field == "id" else ("" if values[field] is None else str(values[field]))
+        for field in fields
+    }
 
 @app.get("/api/dictionary")
-async def get_dictionary(current_user: User = Depends(get_current_user)):
+async def get_dictionary(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=DICTIONARY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Без limit отдаёт весь словарь, с limit — страницу и next_cursor для следующей.
+    ETag строится из версии словаря и параметров запроса: неизменившийся словарь
+    отвечает 304 без чтения строк. format=ndjson выгружает словарь потоком.
+    """
+    selected = parse_dictionary_fields(fields)
+    user_id = current_user["id"]
     try:
-        logger.info(f"Fetching dictionary for user_id: {current_user['id']}")
-        
+        await wait_for_dictionary_writes(user_id)
         with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT id, word, translation, context, created_at 
-                FROM user_dictionary 
-                WHERE user_id = :user_id 
-                ORDER BY created_at DESC
-            """), {"user_id": current_user["id"]})
-            
-            # Преобразуем данные в формат, понятный клиенту
-            words = []
-            for row in result:
-                try:
-                    # Безопасное преобразование строк в JSON
-                    entry = {
-                        "id": row[0],
-                        "word": str(row[1]) if row[1] is not None else "",
-                        "translation": str(row[2]) if row[2] is not None else "",
-                        "context": str(row[3]) if row[3] is not None else "",
-                        "created_at": str(row[4]) if row[4] is not None else ""
-                    }
-                    words.append(entry)
-                except Exception as row_error:
-                    logger.error(f"Error processing dictionary row: {row_error}")
-                    # Пропускаем проблемную запись и продолжаем
-                    continue
-            
-            logger.info(f"Found {len(words)} dictionary entries")
-            return {"words": words}
+            version = get_dictionary_version(conn, user_id)
+        query_key = hashlib.sha1(json.dumps([limit, cursor, selected, format]).encode()).hexdigest()[:16]
+        etag = f'W/"{version}-{query_key}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        if format == "ndjson":
+            def ndjson_rows():
+                with engine.connect() as conn:
+                    result = query_dictionary(conn.execution_options(stream_results=True), user_id, selected, cursor, limit)
+                    for row in result:
+                        yield json.dumps(dictionary_entry(row, selected), ensure_ascii=False) + "\n"
+            return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson", headers=headers)
+
+        with engine.connect() as conn:
+            rows = query_dictionary(conn, user_id, selected, cursor, limit).fetchall()
+        words = [dictionary_entry(row, selected) for row in rows]
+        next_cursor = None
+        if limit and len(rows) == limit:
+            next_cursor = encode_dictionary_cursor(rows[-1].created_at, rows[-1].id)
+        logger.info(f"Found {len(words)} dictionary entries for user_id: {user_id}")
+        return JSONResponse({"words": words, "next_cursor": next_cursor}, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching dictionary: {e}")
         return JSONResponse(
@@ -829,45 +1145,25 @@ async def add_to_dictionary(
                 content={"error": "word and translation cannot be empty"}
             )
         
+        try:
+            language_pair = dictionary_language_pair(word_data)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
         logger.info(f"Adding word to dictionary: {word} -> {translation} for user_id: {current_user['id']}")
         
-        # Проверяем, нет ли уже такого слова в словаре
-        with engine.connect() as conn:
-            check_result = conn.execute(text("""
-                SELECT id FROM user_dictionary 
-                WHERE user_id = :user_id AND word = :word
-            """), {
-                "user_id": current_user["id"],
-                "word": word
-            })
-            existing_word = check_result.fetchone()
-            
-            if existing_word:
-                # Если слово уже есть, обновляем перевод и контекст
-                logger.info(f"Word '{word}' already exists in dictionary, updating")
-                conn.execute(text("""
-                    UPDATE user_dictionary 
-                    SET translation = :translation, context = :context 
-                    WHERE user_id = :user_id AND word = :word
-                """), {
-                    "user_id": current_user["id"],
-                    "word": word,
-                    "translation": translation,
-                    "context": context
-                })
-            else:
-                # Добавляем новое слово
-                conn.execute(text("""
-                    INSERT INTO user_dictionary (user_id, word, translation, context)
-                    VALUES (:user_id, :word, :translation, :context)
-                """), {
-                    "user_id": current_user["id"],
-                    "word": word,
-                    "translation": translation,
-                    "context": context
-                })
-            
-            conn.commit()
+        values = {"word": word, "translation": translation, "context": context, **language_pair}
+        if dictionary_write_behind is not None:
+            # Слово попадёт в базу общей пачкой в течение окна группового коммита
+            dictionary_write_behind.add(current_user["id"], word, values)
+        else:
+            # Одна атомарная запись по уникальному индексу (user_id, word):
+            # если слово уже есть, обновляем перевод и контекст
+            write_dictionary_batch({current_user["id"]: {word: values}})
+
+        translation_memory.replace(
+            current_user["id"], f"dict:{current_user['id']}:{word}", dictionary_memory_items(current_user["id"], values)
+        )
             
         return {"status": "success", "message": "Word added to dictionary"}
     except Exception as e:
@@ -877,12 +1173,195 @@ async def add_to_dictionary(
             content={"error": f"Internal server error: {str(e)}"}
         )
 
+def write_dictionary_batch(batch):
+    """Слова нескольких пользователей одной транзакцией: {user_id: {word: значения}}"""
+    with engine.begin() as conn:
+        conn.execute(UPSERT_DICTIONARY_WORD, [
+            {"user_id": user_id, **values} for user_id, words in batch.items() for values in words.values()
+        ])
+        for user_id, words in batch.items():
+            bump_dictionary_version(conn, user_id)
+            record_changes(conn, user_id, "dictionary", list(words))
+
+dictionary_write_behind = WriteBehindBuffer(
+    write_batch=write_dictionary_batch,
+    window=settings.DICTIONARY_WRITE_BEHIND_WINDOW,
+    max_batch=settings.DICTIONARY_WRITE_BEHIND_MAX_BATCH,
+    max_attempts=settings.DICTIONARY_WRITE_BEHIND_MAX_ATTEMPTS,
+) if settings.DICTIONARY_WRITE_BEHIND else None
+
+async def wait_for_dictionary_writes(user_id: str):
+    """Чтение своих записей: незаписанные слова пользователя сначала уходят в базу"""
+    if dictionary_write_behind is not None:
+        await dictionary_write_behind.wait_for_user(user_id)
+
+def pending_dictionary_words(user_id: str) -> dict:
+    return dictionary_write_behind.pending(user_id) if dictionary_write_behind is not None else {}
+
+@app.get("/api/dictionary/stats")
+async def dictionary_stats(current_user: User = Depends(get_current_user)):
+    """Счётчики кэша слов для проверки страниц и отложенной записи"""
+    return {
+        "known_words": known_words_cache.stats(),
+        "write_behind": dictionary_write_behind.stats() if dictionary_write_behind is not None else None,
+    }
+
+# Массовый импорт и экспорт словаря (CSV с заголовком word,translation,context и необязательными
+# source_lang,target_lang или JSONL)
+DICTIONARY_IMPORT_COLUMNS = ("word", "translation", "context")
+DICTIONARY_IMPORT_MAX_ERRORS = 100
+
+def iter_import_rows(stream, format: str):
+    """Читает загрузку построчно, не держа файл в памяти: (номер строки, dict или ошибка)"""
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        missing = [column for column in ("word", "translation") if column not in (reader.fieldnames or [])]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"CSV header must contain: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, f"Invalid JSON: {e}"
+            continue
+        yield line_num, row if isinstance(row, dict) else "Expected a JSON object"
+
+def validate_import_row(row) -> dict:
+    if isinstance(row, str):
+        raise ValueError(row)
+    values = {}
+    for column in DICTIONARY_IMPORT_COLUMNS:
+        value = row.get(column)
+        values[column] = "" if value is None else str(value).strip()
+    if not values["word"] or not values["translation"]:
+        raise ValueError("word and translation cannot be empty")
+    values.update(dictionary_language_pair(row))
+    return values
+
+def import_dictionary(user_id: str, stream, format: str) -> dict:
+    """
+    Пишет слова пачками по DICTIONARY_IMPORT_BATCH_SIZE: одна транзакция и один
+    executemany на пачку. Повторы слова внутри пачки схлопываются (побеждает
+    последнее) — PostgreSQL не разрешает одному upsert обновить строку дважды.
+    """
+    imported = 0
+    errors = []
+    error_count = 0
+    batch = {}
+
+    def flush():
+        nonlocal imported
+        with engine.begin() as conn:
+            conn.execute(UPSERT_DICTIONARY_WORD, [{"user_id": user_id, **values} for values in batch.values()])
+            bump_dictionary_version(conn, user_id)
+            record_changes(conn, user_id, "dictionary", list(batch))
+        for values in batch.values():
+            translation_memory.replace(user_id, f"dict:{user_id}:{values['word']}", dictionary_memory_items(user_id, values))
+        imported += len(batch)
+        batch.clear()
+
+    for rows_read, (line_num, row) in enumerate(iter_import_rows(stream, format), start=1):
+        if rows_read > settings.DICTIONARY_IMPORT_MAX_ROWS:
+            errors.append({"line": line_num, "error": f"Row limit of {settings.DICTIONARY_IMPORT_MAX_ROWS} exceeded, rest of file skipped"})
+            error_count += 1
+            break
+        try:
+            values = validate_import_row(row)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < DICTIONARY_IMPORT_MAX_ERRORS:
+                errors.append({"line": line_num, "error": str(e)})
+            continue
+        batch.pop(values["word"], None)
+        batch[values["word"]] = values
+        if len(batch) >= settings.DICTIONARY_IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return {"status": "success", "imported": imported, "skipped": error_count, "errors": errors}
+
+@app.post("/api/dictionary/import")
+async def import_dictionary_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(default=None, pattern="^(csv|jsonl)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Формат берётся из параметра format или из расширения файла"""
+    if format is None:
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        format = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(extension)
+        if format is None:
+            raise HTTPException(status_code=400, detail="Unknown file format, pass format=csv or format=jsonl")
+    try:
+        # Слова из буфера не должны перезаписать более новые из файла
+        await wait_for_dictionary_writes(current_user["id"])
+        result = await asyncio.to_thread(import_dictionary, current_user["id"], file.file, format)
+    except HTTPException:
+        raise
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    logger.info(f"Imported {result['imported']} dictionary entries for user_id: {current_user['id']}")
+    return result
+
+@app.get("/api/dictionary/export")
+async def export_dictionary(
+    format: str = Query(default="csv", pattern="^(csv|jsonl)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Выгрузка всего словаря потоком в формате, который принимает импорт"""
+    user_id = current_user["id"]
+    await wait_for_dictionary_writes(user_id)
+    fields = [*DICTIONARY_IMPORT_COLUMNS, "source_lang", "target_lang"]
+
+    def rows():
+        with engine.connect() as conn:
+            yield from query_dictionary(conn.execution_options(stream_results=True), user_id, fields, None, None)
+
+    def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for row in rows():
+            writer.writerow(dictionary_entry(row, fields).values())
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def jsonl_lines():
+        for row in rows():
+            yield json.dumps(dictionary_entry(row, fields), ensure_ascii=False) + "\n"
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        csv_lines() if format == "csv" else jsonl_lines(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="dictionary.{format}"'}
+    )
+
 @app.delete("/api/dictionary/{word_id}")
 async def remove_from_dictionary(
     word_id: int,
     current_user: User = Depends(get_current_user)
 ):
-    with engine.connect() as conn:
+    # Иначе слово из буфера запишется уже после удаления и «воскреснет»
+    await wait_for_dictionary_writes(current_user["id"])
+    with engine.begin() as conn:
+        removed = conn.execute(text("""
+            SELECT word FROM user_dictionary 
+            WHERE id = :word_id AND user_id = :user_id
+        """), {
+            "word_id": word_id,
+            "user_id": current_user["id"]
+        }).fetchone()
         conn.execute(text("""
             DELETE FROM user_dictionary 
             WHERE id = :word_id AND user_id = :user_id
@@ -890,14 +1369,52 @@ async def remove_from_dictionary(
             "word_id": word_id,
             "user_id": current_user["id"]
         })
-        conn.commit()
+        if removed:
+            bump_dictionary_version(conn, current_user["id"])
+            record_changes(conn, current_user["id"], "dictionary", [removed[0]], deleted=True)
+    if removed:
+        translation_memory.remove(current_user["id"], f"dict:{current_user['id']}:{removed[0]}")
     return {"status": "success"}
 
+# Класс для пакетной проверки слов страницы
+class DictionaryCheckRequest(BaseModel):
+    words: List[str]
+
+def check_known_words(user_id: str, words: List[str]) -> List[bool]:
+    def load_words():
+        with engine.connect() as conn:
+            return [row[0] for row in conn.execute(
+                text("SELECT word FROM user_dictionary WHERE user_id = :user_id"), {"user_id": user_id}
+            )]
+
+    with engine.connect() as conn:
+        version = get_dictionary_version(conn, user_id)
+    known = known_words_cache.get(user_id, version, load_words)
+    pending = {normalize_word(word) for word in pending_dictionary_words(user_id)}
+    return [normalize_word(word) in known or normalize_word(word) in pending for word in words]
+
+@app.post("/api/dictionary/check")
+async def check_words_in_dictionary(
+    request_data: DictionaryCheckRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Проверка всех слов страницы за один запрос (без учёта регистра): flags идут
+    в порядке words, known — слова из запроса, которые есть в словаре.
+    """
+    if len(request_data.words) > settings.DICTIONARY_CHECK_MAX_WORDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.DICTIONARY_CHECK_MAX_WORDS} words per request")
+    flags = await asyncio.to_thread(check_known_words, current_user["id"], request_data.words)
+    known = list(dict.fromkeys(word for word, flag in zip(request_data.words, flags) if flag))
+    return {"flags": flags, "known": known}
+
 @app.get("/api/dictionary/check")
 async def check_word_in_dictionary(
     word: str,
     current_user: User = Depends(get_current_user)
 ):
+    if word in pending_dictionary_words(current_user["id"]):
+        return {"exists": True}
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT id FROM user_dictionary 
@@ -907,4 +1424,74 @@ async def check_word_in_dictionary(
             "word": word
         })
         exists = result.fetchone() is not None
-    return {"exists": exists} 
\ No newline at end of file
+    return {"exists": exists}
+
+def read_changes(user_id: str, since: int, limit: int) -> dict:
+    """
+    Изменения после since, не разрывая одну транзакцию (один seq) между страницами.
+    Для изменённых сущностей отдаётся их текущее состояние, для удалённых — ключ.
+    """
+    changes_query = text("""
+        SELECT entity, entity_key, seq, deleted FROM change_log
+        WHERE user_id = :user_id AND seq > :since
+        ORDER BY seq LIMIT :limit
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(changes_query, {"user_id": user_id, "since": since, "limit": limit + 1}).fetchall()
+        has_more = len(rows) > limit
+        if has_more:
+            boundary = rows[limit].seq
+            rows = [row for row in rows if row.seq < boundary]
+            if not rows:
+                # Одна транзакция больше страницы — отдаём её целиком
+                rows = conn.execute(text("""
+                    SELECT entity, entity_key, seq, deleted FROM change_log
+                    WHERE user_id = :user_id AND seq = :seq
+                """), {"user_id": user_id, "seq": boundary}).fetchall()
+
+        changed = {entity: [row.entity_key for row in rows if row.entity == entity and not row.deleted] for entity in CHANGE_ENTITIES}
+        deleted = {entity: [row.entity_key for row in rows if row.entity == entity and row.deleted] for entity in CHANGE_ENTITIES}
+
+        words = []
+        if changed["dictionary"]:
+            # Имена колонок берутся только из DICTIONARY_FIELDS
+            words = [dictionary_entry(row, list(DICTIONARY_FIELDS)) for row in conn.execute(
+                text(f"""
+                    SELECT {", ".join(DICTIONARY_FIELDS)} FROM user_dictionary
+                    WHERE user_id = :user_id AND word IN :words
+                """).bindparams(bindparam("words", expanding=True)),
+                {"user_id": user_id, "words": changed["dictionary"]}
+            )]
+        mappings = []
+        if changed["mapping"]:
+            for file_id, filename in conn.execute(
+                text("""
+                    SELECT f.id, f.filename FROM files_with_mapping m
+                    JOIN user_files f ON f.id = m.file_id
+                    WHERE f.user_id = :user_id AND m.file_id IN :file_ids
+                """).bindparams(bindparam("file_ids", expanding=True)),
+                {"user_id": user_id, "file_ids": changed["mapping"]}
+            ).fetchall():
+                mapping = json.loads(load_mapping_json(conn, file_id))
+                mappings.append({"file_id": file_id, "filename": filename, "mapping": mapping})
+
+    return {
+        "since": since,
+        "seq": max((row.seq for row in rows), default=since),
+        "has_more": has_more,
+        "dictionary": {"upserted": words, "deleted": deleted["dictionary"]},
+        "mappings": {"upserted": mappings, "deleted": deleted["mapping"]},
+    }
+
+@app.get("/api/sync/changes")
+async def get_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=SYNC_PAGE_MAX),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Дельта-синхронизация: клиент хранит seq из ответа и передаёт его как since.
+    since=0 возвращает всё текущее состояние; при has_more нужно запросить ещё.
+    """
+    await wait_for_dictionary_writes(current_user["id"])
+    return await asyncio.to_thread(read_changes, current_user["id"], since, limit)
@@ -0,0 +1,153 @@
+from sqlalchemy import Column, ForeignKey, Float, Index, Integer, LargeBinary, String, Boolean, DateTime, Text, UniqueConstraint
+from sqlalchemy.sql import expression, func
+from app.db.base_class import Base
+
+
+# Таблицы читалки (app/main.py). Идентификаторы пользователей и файлов — UUID в виде строк
+
+
+class ReaderUser(Base):
+    __tablename__ = "users"
+
+    id = Column(String(36), primary_key=True)
+    username = Column(String, unique=True)
+    email = Column(String, unique=True, nullable=True)
+    hashed_password = Column(String)
+    is_active = Column(Boolean, server_default=expression.true())
+    is_superuser = Column(Boolean, server_default=expression.false())
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class UserFile(Base):
+    __tablename__ = "user_files"
+    __table_args__ = (
+        # Список файлов пользователя отдаётся от новых к старым
+        Index("ix_user_files_user_id_upload_date", "user_id", "upload_date"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id"))
+    filename = Column(String)
+    original_filename = Column(String)
+    file_size = Column(Integer)
+    upload_date = Column(DateTime, server_default=func.now())
+
+
+class FileMapping(Base):
+    """
+    Сопоставление подготовленной книги: payload — весь JSON сжатым блобом для полной
+    выдачи, абзацы для выдачи по диапазону лежат в mapping_segments. Строки старого
+    формата (paragraph_count IS NULL) хранят всё сопоставление текстом в mapping_data.
+    """
+    __tablename__ = "files_with_mapping"
+    __table_args__ = (UniqueConstraint("file_id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(String(36), ForeignKey("user_files.id", ondelete="CASCADE"), nullable=False)
+    mapping_data = Column(Text, nullable=False)
+    payload = Column(LargeBinary)
+    paragraph_count = Column(Integer)
+    segment_size = Column(Integer)
+    version = Column(Integer, nullable=False, server_default="0")
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class MappingSegment(Base):
+    """Сегмент сопоставления: paragraph_count абзацев подряд, начиная с first_paragraph"""
+    __tablename__ = "mapping_segments"
+
+    file_id = Column(String(36), ForeignKey("user_files.id", ondelete="CASCADE"), primary_key=True)
+    ordinal = Column(Integer, primary_key=True, autoincrement=False)
+    first_paragraph = Column(Integer, nullable=False)
+    paragraph_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class DictionaryEntry(Base):
+    __tablename__ = "user_dictionary"
+    __table_args__ = (
+        # Одно слово в словаре пользователя: на этом индексе держится upsert
+        Index("ix_user_dictionary_user_id_word", "user_id", "word", unique=True),
+        # Постраничная выдача словаря по курсору (created_at, id)
+        Index("ix_user_dictionary_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    word = Column(Text, nullable=False)
+    translation = Column(Text, nullable=False)
+    context = Column(Text)
+    # Направление перевода слова; без него слово не используется памятью переводов
+    source_lang = Column(String(8))
+    target_lang = Column(String(8))
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class DictionaryVersion(Base):
+    """Номер версии словаря пользователя: растёт при каждом изменении, из него строится ETag"""
+    __tablename__ = "dictionary_versions"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, server_default="0")
+
+
+class FilePage(Base):
+    __tablename__ = "file_pages"
+
+    file_id = Column(String(36), ForeignKey("user_files.id", ondelete="CASCADE"), primary_key=True)
+    page = Column(Integer, primary_key=True, autoincrement=False)
+    text = Column(Text, nullable=False)
+
+
+class ChangeSequence(Base):
+    """Счётчик изменений пользователя: одна транзакция — один следующий номер"""
+    __tablename__ = "change_sequences"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    seq = Column(Integer, nullable=False, server_default="0")
+
+
+class ChangeLogEntry(Base):
+    """
+    Сжатая лента изменений: по строке на сущность (слово словаря, сопоставление
+    файла) с номером последнего изменения; deleted — надгробие удалённой сущности.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_user_id_seq", "user_id", "seq"),
+    )
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    entity = Column(String(16), primary_key=True)
+    entity_key = Column(Text, primary_key=True)
+    seq = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, server_default=expression.false())
+
+
+class Job(Base):
+    """
+    Фоновая задача (kind — тип, например подготовка книги). claim — метка воркера,
+    который её выполняет, heartbeat — время его последней отметки живости (unix time).
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Выбор следующей задачи из очереди
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String(32), nullable=False)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    file_id = Column(String(36), ForeignKey("user_files.id", ondelete="CASCADE"))
+    status = Column(String(16), nullable=False, server_default="queued")
+    progress = Column(Float, nullable=False, server_default="0")
+    stage = Column(String(64))
+    params = Column(Text)
+    result = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    claim = Column(String(36))
+    heartbeat = Column(Float)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,172 @@
+import math
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+# Выравнивание по длинам (Gale & Church, 1993): пары текстов разбиваются на «бусины» —
+# группы соседних абзацев, переводящих друг друга. Стоимость бусины — минус логарифм
+# априорной вероятности её типа и вероятности наблюдаемого расхождения длин.
+BEADS = (
+    ((1, 1), 0.89),
+    ((1, 0), 0.0099 / 2),
+    ((0, 1), 0.0099 / 2),
+    ((2, 1), 0.089 / 2),
+    ((1, 2), 0.089 / 2),
+    ((2, 2), 0.011),
+)
+# Дисперсия отношения длин на символ, оценка из статьи
+VARIANCE = 6.8
+
+
+@dataclass
+class Bead:
+    source_start: int
+    source_count: int
+    target_start: int
+    target_count: int
+    # Вероятность расхождения длин не меньше наблюдаемого: 1 — длины точно соответствуют
+    confidence: float
+
+
+def _neg_log_erfc(x: np.ndarray) -> np.ndarray:
+    """-log(erfc(x)) для x >= 0 без переполнения (приближение erfcc из Numerical Recipes)"""
+    t = 1.0 / (1.0 + 0.5 * x)
+    poly = -1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    return -np.log(t) + x * x - poly
+
+
+def _length_cost(source_length: np.ndarray, target_length: np.ndarray, ratio: float) -> np.ndarray:
+    """Минус логарифм вероятности расхождения длин (двусторонний хвост нормального распределения)"""
+    mean = (source_length + target_length / ratio) / 2
+    delta = np.abs(source_length * ratio - target_length) / np.sqrt(np.maximum(mean, 1e-9) * VARIANCE)
+    return _neg_log_erfc(delta / math.sqrt(2))
+
+
+def _band(rows: int, cols: int, width: int) -> np.ndarray:
+    """Начало полосы поиска в каждой строке: полоса идёт вдоль диагонали от (0, 0) к (rows, cols)"""
+    centers = np.rint(np.arange(rows + 1) * (cols / max(rows, 1))).astype(np.int64)
+    return np.clip(centers - width, 0, max(cols - 2 * width, 0))
+
+
+def _align_banded(source: np.ndarray, target: np.ndarray, ratio: float, width: int, progress=None):
+    n, m = len(source), len(target)
+    band = min(2 * width + 1, m + 1)
+    lo = _band(n, m, width)
+    source_prefix = np.concatenate(([0.0], np.cumsum(source)))
+    target_prefix = np.concatenate(([0.0], np.cumsum(target)))
+    priors = [(a, b, -math.log(p)) for (a, b), p in BEADS]
+    skip_move = [(a, b) for a, b, _ in priors].index((0, 1))
+    # Бусины, забирающие хотя бы один абзац оригинала: переход из строк i - a
+    moves = [index for index, (a, _, _) in enumerate(priors) if a > 0]
+    move_a = np.array([priors[index][0] for index in moves])
+    move_b = np.array([priors[index][1] for index in moves])[:, None]
+    move_prior = np.array([priors[index][2] for index in moves])[:, None]
+    move_index = np.array(moves, dtype=np.int8)
+
+    # Стоимости нужны только для трёх последних строк (бусины забирают до двух абзацев),
+    # для обратного прохода хранятся лишь ходы. Лишний последний столбец — бесконечность
+    # для переходов из-за края полосы
+    cost = np.full((3, band + 1), np.inf)
+    move = np.full((n + 1, band), -1, dtype=np.int8)
+    offsets = np.arange(band)
+    skip_costs = priors[skip_move][2] + _length_cost(0.0, target, ratio)
+
+    for i in range(n + 1):
+        if progress is not None and i % 512 == 0:
+            progress(i / (n + 1))
+        j = lo[i] + offsets
+        valid = j <= m
+        if i == 0:
+            best = np.full(band, np.inf)
+            best[0] = 0.0
+            best_move = np.full(band, -1, dtype=np.int8)
+        else:
+            usable = move_a <= i
+            a = move_a[usable]
+            prev_rows = i - a
+            prev_j = j[None, :] - move_b[usable]
+            prev_col = prev_j - lo[prev_rows][:, None]
+            prev_col[(prev_col < 0) | (prev_col >= band) | (prev_j < 0) | ~valid[None, :]] = band
+            source_length = (source_prefix[i] - source_prefix[prev_rows])[:, None]
+            target_length = target_prefix[np.minimum(j, m)][None, :] - target_prefix[np.clip(prev_j, 0, m)]
+            totals = (
+                cost[(prev_rows % 3)[:, None], prev_col]
+                + move_prior[usable]
+                + _length_cost(source_length, target_length, ratio)
+            )
+            choice = np.argmin(totals, axis=0)
+            best = totals[choice, offsets]
+            best_move = move_index[usable][choice]
+
+        # Пропуск абзаца перевода (0-1) зависит от соседней клетки той же строки:
+        # cost[j] = min(best[j], cost[j-1] + skip[j]) считается префиксным минимумом
+        # (skip[0] в сумму не входит; за пределами m клетки всё равно отбрасываются)
+        skip = np.where(valid & (j > 0), skip_costs[np.clip(j - 1, 0, m - 1)], 0.0)
+        skip_prefix = np.cumsum(skip)
+        row = skip_prefix + np.minimum.accumulate(best - skip_prefix)
+        from_skip = row < best - 1e-9 * np.maximum(1.0, np.abs(row))
+        best_move[from_skip] = skip_move
+        row[~valid] = np.inf
+        cost[i % 3, :band] = row
+        move[i] = best_move
+
+    return cost[n % 3, :band], move, lo, priors
+
+
+def align(
+    source_lengths: Sequence[int],
+    target_lengths: Sequence[int],
+    band: int = settings.ALIGNMENT_BAND,
+    max_band: int = settings.ALIGNMENT_MAX_BAND,
+    progress: Optional[Callable[[float], None]] = None,
+) -> List[Bead]:
+    """
+    Выравнивает два текста по длинам абзацев (или предложений) в символах.
+    Поиск идёт в полосе шириной 2 * band вдоль диагонали; если лучший путь упёрся
+    в край полосы, поиск повторяется с вдвое более широкой полосой, но не шире max_band.
+    progress(доля от 0 до 1) вызывается по ходу каждого прохода.
+    """
+    source = np.asarray(source_lengths, dtype=np.float64)
+    target = np.asarray(target_lengths, dtype=np.float64)
+    n, m = len(source), len(target)
+    if n == 0 or m == 0:
+        return [Bead(i, 1, m, 0, 0.0) for i in range(n)] + [Bead(n, 0, j, 1, 0.0) for j in range(m)]
+
+    # Отношение длин перевода к оригиналу оцениваем по самим текстам
+    ratio = max(target.sum(), 1.0) / max(source.sum(), 1.0)
+    width = max(band, 2 * math.ceil(max(n, m) / min(n, m)))
+    limit = min(max(max_band, width), max(n, m))
+    while True:
+        width = min(width, limit)
+        last_row, move, lo, priors = _align_banded(source, target, ratio, width, progress)
+        band_size = move.shape[1]
+        path = []
+        i, j = n, m
+        # Угол (n, m) вне полосы или недостижим — полоса слишком узкая
+        touched = not (0 <= m - lo[n] < band_size and np.isfinite(last_row[m - lo[n]]))
+        if not touched:
+            while i > 0 or j > 0:
+                col = j - lo[i]
+                if (col == 0 and lo[i] > 0) or (col == band_size - 1 and j < m):
+                    touched = True
+                a, b, _ = priors[move[i, col]]
+                path.append((i - a, a, j - b, b))
+                i, j = i - a, j - b
+        if not touched or width >= limit:
+            break
+        width *= 2
+
+    beads = []
+    for source_start, a, target_start, b in reversed(path):
+        length_cost = _length_cost(
+            np.float64(source[source_start:source_start + a].sum()),
+            np.float64(target[target_start:target_start + b].sum()),
+            ratio,
+        )
+        beads.append(Bead(source_start, a, target_start, b, min(float(np.exp(-length_cost)), 1.0)))
+    return beads
@@ -0,0 +1,234 @@
+"""
+Компактное хранилище двуязычных словарей.
+
+Формат файла (.dict), все числа little-endian:
+    заголовок:  magic b"RTDICT01", count (uint32)
+    индекс:     count смещений записей (uint32), отсортированных по ключу
+    записи:     key_len (uint16), value_len (uint32), key (UTF-8), value (UTF-8)
+
+Ключ — фраза в нижнем регистре, токены через один пробел. Файл открывается
+через mmap только для чтения, поэтому все воркеры uvicorn делят одни и те же
+страницы в page cache вместо собственной копии словаря в памяти.
+"""
+import functools
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.offline_translator import tokenize
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RTDICT01"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+_RECORD = struct.Struct("<HI")
+
+# Код языка попадает в имя файла, поэтому допускаем только буквы
+_LANG_RE = re.compile(r'^[A-Za-z]{2,8}$')
+
+# Словари, поставляемые вместе с приложением (исходники в TSV)
+BUNDLED_DIR = Path(__file__).resolve().parent.parent / "data" / "dictionaries"
+
+
+def normalize_phrase(phrase: str) -> str:
+    return " ".join(token.lower() for token in tokenize(phrase))
+
+
+def read_tsv(path: Path) -> Iterator[Tuple[str, str]]:
+    """Читает словарь в формате "фраза<TAB>перевод", пропуская комментарии"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#") or "\t" not in line:
+                continue
+            phrase, translation = line.split("\t", 1)
+            yield phrase, translation.strip()
+
+
+def build_dictionary(entries: Iterable[Tuple[str, str]], path: Path) -> int:
+    """
+    Собирает .dict из пар (фраза, перевод). При повторе ключа побеждает
+    последняя запись. Файл пишется атомарно, чтобы параллельные воркеры
+    не увидели его недописанным.
+    """
+    merged: Dict[bytes, bytes] = {}
+    for phrase, translation in entries:
+        key = normalize_phrase(phrase)
+        if not key:
+            continue
+        if key.encode("utf-8") in merged:
+            logger.warning(f"Duplicate dictionary key '{key}', keeping the last translation")
+        merged[key.encode("utf-8")] = translation.encode("utf-8")
+
+    keys = sorted(merged)
+    index_size = _OFFSET.size * len(keys)
+    offset = _HEADER.size + index_size
+    offsets = []
+    records = []
+    for key in keys:
+        value = merged[key]
+        offsets.append(offset)
+        record = _RECORD.pack(len(key), len(value)) + key + value
+        records.append(record)
+        offset += len(record)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(keys)))
+            f.write(b"".join(_OFFSET.pack(item) for item in offsets))
+            f.write(b"".join(records))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(keys)
+
+
+class MmapDictionary:
+    """Отсортированный словарь в файле, доступный через mmap с бинарным поиском"""
+
+    def __init__(self, path: Path, lookup_cache_size: int = 65536):
+        self.path = Path(path)
+        # Частые слова не ищем бинарным поиском каждый раз: небольшой LRU поверх mmap
+        self._first_step = functools.lru_cache(maxsize=lookup_cache_size)(self._first_step)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a dictionary file")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, index: int) -> Tuple[bytes, int, int]:
+        (offset,) = _OFFSET.unpack_from(self._mm, _HEADER.size + index * _OFFSET.size)
+        key_len, value_len = _RECORD.unpack_from(self._mm, offset)
+        key_start = offset + _RECORD.size
+        return self._mm[key_start:key_start + key_len], key_start + key_len, value_len
+
+    def _lower_bound(self, key: bytes, lo: int, hi: int) -> int:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _step(self, key: bytes, lo: int, hi: int) -> Tuple[Optional[str], int, int]:
+        """
+        Переход по неявному префиксному дереву поверх отсортированных ключей: перевод
+        ключа key и диапазон [lo, hi) ключей, продолжающих его следующим токеном.
+        Искать нужно только внутри диапазона родителя: все ключи с префиксом key лежат там.
+        """
+        index = self._lower_bound(key, lo, hi)
+        value = None
+        if index < hi:
+            found, value_start, value_len = self._record(index)
+            if found == key:
+                value = self._mm[value_start:value_start + value_len].decode("utf-8")
+                index += 1
+        # Продолжения — ключи от "key " до "key!" (пробел — 0x20, "!" — следующий байт)
+        start = self._lower_bound(key + b" ", index, hi)
+        return value, start, self._lower_bound(key + b"!", start, hi)
+
+    def _first_step(self, key: bytes) -> Tuple[Optional[str], int, int]:
+        return self._step(key, 0, self.count)
+
+    def scan(self, tokens: Sequence[str]) -> Iterator[Tuple[int, int, Optional[str]]]:
+        """
+        Выдаёт (start, end, translation) для каждого участка текста: самой длинной
+        найденной фразы или одиночного токена без перевода (translation is None).
+        Фраза продлевается, пока у неё остаются продолжения в словаре; каждый шаг —
+        бинарный поиск внутри всё более узкого диапазона ключей.
+        """
+        lowered: List[bytes] = [token.lower().encode("utf-8") for token in tokens]
+        position = 0
+        total = len(tokens)
+        while position < total:
+            best_end, best_value = position + 1, None
+            key = lowered[position]
+            value, lo, hi = self._first_step(key)
+            end = position + 1
+            while True:
+                if value is not None:
+                    best_end, best_value = end, value
+                if end >= total or lo >= hi:
+                    break
+                key = key + b" " + lowered[end]
+                value, lo, hi = self._step(key, lo, hi)
+                end += 1
+            yield position, best_end, best_value
+            position = best_end
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class DictionaryRegistry:
+    """
+    Словари по парам языков: файлы {source}-{target}.dict в каталоге словарей.
+    Поставляемые TSV-исходники компилируются в этот каталог при первом обращении.
+    """
+
+    def __init__(self, directory: str, bundled_dir: Path = BUNDLED_DIR):
+        self.directory = Path(directory)
+        self.bundled_dir = bundled_dir
+        self._dictionaries: Dict[Tuple[str, str], Optional[MmapDictionary]] = {}
+        self._lock = threading.Lock()
+
+    def _compile_bundled(self, name: str) -> None:
+        source = self.bundled_dir / f"{name}.tsv"
+        target = self.directory / f"{name}.dict"
+        if not source.exists():
+            return
+        if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+            return
+        count = build_dictionary(read_tsv(source), target)
+        logger.info(f"Compiled dictionary {name}: {count} entries")
+
+    def get(self, source_lang: str, target_lang: str) -> Optional[MmapDictionary]:
+        if not _LANG_RE.match(source_lang) or not _LANG_RE.match(target_lang):
+            return None
+        pair = (source_lang, target_lang)
+        with self._lock:
+            if pair in self._dictionaries:
+                return self._dictionaries[pair]
+
+            name = f"{source_lang}-{target_lang}"
+            dictionary = None
+            try:
+                self._compile_bundled(name)
+                path = self.directory / f"{name}.dict"
+                if path.exists():
+                    dictionary = MmapDictionary(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading dictionary {name}: {e}")
+            self._dictionaries[pair] = dictionary
+            return dictionary
+
+
+dictionary_registry = DictionaryRegistry(settings.DICTIONARY_DIR)
+
+
+if __name__ == "__main__":
+    # python -m app.services.bilingual_dictionary words.tsv dictionaries/en-ru.dict
+    if len(sys.argv) != 3:
+        print("Usage: python -m app.services.bilingual_dictionary <input.tsv> <output.dict>")
+        sys.exit(1)
+    total = build_dictionary(read_tsv(Path(sys.argv[1])), Path(sys.argv[2]))
+    print(f"Wrote {total} entries to {sys.argv[2]}")
@@ -0,0 +1,323 @@
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Сопоставление книги хранится сегментами по segment_size абзацев. data сегмента —
+# тело JSON-объекта без фигурных скобок ('"0":{...},"1":{...}'), поэтому полное
+# сопоставление собирается склейкой сегментов без разбора JSON. Полный JSON
+# сохраняется ещё и целиком в files_with_mapping.payload, чтобы отдавать его как есть,
+# если в сжатом виде он не больше MAPPING_PAYLOAD_MAX_BYTES; большие книги отдаются
+# потоком из сегментов.
+#
+# И сегменты, и payload — сжатые блобы: первый байт — формат, дальше данные.
+# Коды форматов совпадают с Content-Encoding, так что сжатое отдаётся клиенту без перепаковки.
+IDENTITY, GZIP, ZSTD, BR = 0, 1, 2, 3
+CODECS = {"identity": IDENTITY, "gzip": GZIP, "zstd": ZSTD, "br": BR}
+ENCODINGS = {code: name for name, code in CODECS.items()}
+
+Blob = Union[bytes, memoryview, str]
+
+
+def dumps(value) -> bytes:
+    """JSON в UTF-8; orjson, если установлен"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _Encoder:
+    """Потоковое сжатие в выбранный формат с байтом формата в начале"""
+
+    def __init__(self, encoding: str, level: int, max_size: Optional[int] = None):
+        if encoding not in CODECS:
+            raise ValueError(f"Unknown mapping compression: {encoding}")
+        self.code = CODECS[encoding]
+        if self.code == GZIP:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._compressor.compress, self._compressor.flush
+        elif self.code == ZSTD:
+            if zstandard is None:
+                raise RuntimeError("MAPPING_COMPRESSION=zstd requires the zstandard package")
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._flush = self._compressor.compress, self._compressor.flush
+        elif self.code == BR:
+            if brotli is None:
+                raise RuntimeError("MAPPING_COMPRESSION=br requires the brotli package")
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+            self._compress, self._flush = self._compressor.process, self._compressor.finish
+        else:
+            self._compress, self._flush = bytes, bytes
+        self._parts = [bytes([self.code])]
+        self._size = 1
+        self.max_size = max_size
+
+    def write(self, data: bytes) -> None:
+        if self._parts is None:
+            return
+        part = self._compress(data)
+        self._parts.append(part)
+        self._size += len(part)
+        if self.max_size is not None and self._size > self.max_size:
+            # Не держим в памяти то, что всё равно не будет сохранено
+            self._parts = None
+
+    def finish(self) -> Optional[bytes]:
+        """Сжатые данные или None, если они превысили max_size"""
+        if self._parts is None:
+            return None
+        self._parts.append(self._flush())
+        blob = b"".join(self._parts)
+        if self.max_size is not None and len(blob) > self.max_size:
+            return None
+        return blob
+
+
+def encode_blob(data: bytes, encoding: str = settings.MAPPING_COMPRESSION) -> bytes:
+    encoder = _Encoder(encoding, settings.MAPPING_COMPRESSION_LEVEL)
+    encoder.write(data)
+    return encoder.finish()
+
+
+def _as_blob(value: Blob) -> bytes:
+    # Текст — несжатые данные, записанные до появления формата; memoryview отдаёт psycopg2
+    if isinstance(value, str):
+        return bytes([IDENTITY]) + value.encode("utf-8")
+    return bytes(value)
+
+
+def blob_encoding(value: Blob) -> str:
+    """Content-Encoding, в котором лежат данные блоба"""
+    code = _as_blob(value)[0]
+    if code not in ENCODINGS:
+        raise ValueError(f"Unknown mapping blob format: {code}")
+    return ENCODINGS[code]
+
+
+def blob_content(value: Blob) -> bytes:
+    """Данные блоба как есть, без байта формата"""
+    return _as_blob(value)[1:]
+
+
+def decode_blob(value: Blob) -> bytes:
+    blob = _as_blob(value)
+    code, data = blob[0], blob[1:]
+    if code == IDENTITY:
+        return data
+    if code == GZIP:
+        return zlib.decompress(data, 47)
+    if code == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Mapping is compressed with zstd, install the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if code == BR:
+        if brotli is None:
+            raise RuntimeError("Mapping is compressed with br, install the brotli package")
+        return brotli.decompress(data)
+    raise ValueError(f"Unknown mapping blob format: {code}")
+
+
+def _fragment(paragraphs: Iterable[Tuple[int, dict]]) -> bytes:
+    return dumps({str(i): paragraph for i, paragraph in paragraphs})[1:-1]
+
+
+def build_segments(paragraphs: Iterable[Tuple[int, dict]], segment_size: int) -> Iterator[dict]:
+    """
+    Режет поток абзацев (номер, {english, russian}) по возрастанию номеров на несжатые
+    строки mapping_segments; в памяти одновременно только один сегмент.
+    """
+    chunk = []
+    ordinal = 0
+    for item in paragraphs:
+        chunk.append(item)
+        if len(chunk) == segment_size:
+            yield {"ordinal": ordinal, "first_paragraph": chunk[0][0], "paragraph_count": len(chunk), "data": _fragment(chunk)}
+            chunk = []
+            ordinal += 1
+    if chunk:
+        yield {"ordinal": ordinal, "first_paragraph": chunk[0][0], "paragraph_count": len(chunk), "data": _fragment(chunk)}
+
+
+INSERT_SEGMENT = text("""
+    INSERT INTO mapping_segments (file_id, ordinal, first_paragraph, paragraph_count, data)
+    VALUES (:file_id, :ordinal, :first_paragraph, :paragraph_count, :data)
+""")
+
+
+def save_mapping(
+    conn,
+    file_id: str,
+    paragraphs: Iterable[Tuple[int, dict]],
+    segment_size: int = settings.MAPPING_SEGMENT_SIZE,
+) -> int:
+    """
+    Заменяет сопоставление файла целиком; возвращает новую версию. Абзацы могут
+    приходить генератором: сегменты пишутся в базу по мере заполнения.
+    """
+    conn.execute(text("DELETE FROM mapping_segments WHERE file_id = :file_id"), {"file_id": file_id})
+    payload = _Encoder(settings.MAPPING_COMPRESSION, settings.MAPPING_COMPRESSION_LEVEL, settings.MAPPING_PAYLOAD_MAX_BYTES)
+    payload.write(b"{")
+    paragraph_count = 0
+    for segment in build_segments(paragraphs, segment_size):
+        if paragraph_count:
+            payload.write(b",")
+        payload.write(segment["data"])
+        paragraph_count += segment["paragraph_count"]
+        conn.execute(INSERT_SEGMENT, {"file_id": file_id, **segment, "data": encode_blob(segment["data"])})
+    payload.write(b"}")
+    # mapping_data остаётся пустым: полный JSON лежит в payload (или только в сегментах)
+    return conn.execute(text("""
+        INSERT INTO files_with_mapping (file_id, mapping_data, payload, paragraph_count, segment_size, version)
+        VALUES (:file_id, '', :payload, :paragraph_count, :segment_size, 1)
+        ON CONFLICT (file_id) DO UPDATE
+        SET mapping_data = '', payload = excluded.payload, paragraph_count = excluded.paragraph_count,
+            segment_size = excluded.segment_size, version = files_with_mapping.version + 1,
+            created_at = CURRENT_TIMESTAMP
+        RETURNING version
+    """), {
+        "file_id": file_id,
+        "payload": payload.finish(),
+        "paragraph_count": paragraph_count,
+        "segment_size": segment_size,
+    }).scalar_one()
+
+
+def delete_mapping(conn, file_id: str) -> bool:
+    conn.execute(text("DELETE FROM mapping_segments WHERE file_id = :file_id"), {"file_id": file_id})
+    return conn.execute(
+        text("DELETE FROM files_with_mapping WHERE file_id = :file_id"), {"file_id": file_id}
+    ).rowcount > 0
+
+
+def load_mapping_meta(conn, file_id: str) -> Optional[dict]:
+    row = conn.execute(text("""
+        SELECT paragraph_count, segment_size, version, created_at, mapping_data
+        FROM files_with_mapping WHERE file_id = :file_id
+    """), {"file_id": file_id}).fetchone()
+    if row is None:
+        return None
+    paragraph_count = row.paragraph_count
+    if paragraph_count is None:
+        # Сопоставление старого формата целиком в mapping_data
+        paragraph_count = len(json.loads(row.mapping_data))
+    return {
+        "file_id": file_id,
+        "paragraph_count": paragraph_count,
+        "segment_size": row.segment_size,
+        "version": row.version,
+        "created_at": str(row.created_at),
+    }
+
+
+def _iter_segment_data(conn, file_id: str) -> Iterator[bytes]:
+    # stream_results: PostgreSQL отдаёт строки по мере чтения, а не все сразу
+    rows = conn.execute(
+        text("SELECT data FROM mapping_segments WHERE file_id = :file_id ORDER BY ordinal").execution_options(
+            stream_results=True
+        ),
+        {"file_id": file_id}
+    ).scalars()
+    for data in rows:
+        yield decode_blob(data)
+
+
+def load_mapping_payload(conn, file_id: str) -> Optional[bytes]:
+    """
+    Полное сопоставление блобом: JSON в том сжатии, в каком оно хранится. None — если
+    сопоставления нет или оно слишком большое и хранится только сегментами
+    (тогда его отдаёт iter_mapping_json).
+    """
+    row = conn.execute(
+        text("SELECT mapping_data, payload, paragraph_count FROM files_with_mapping WHERE file_id = :file_id"),
+        {"file_id": file_id}
+    ).fetchone()
+    if row is None:
+        return None
+    if row.payload is not None:
+        return _as_blob(row.payload)
+    if row.paragraph_count is None:
+        return _as_blob(row.mapping_data)
+    return None
+
+
+def iter_mapping_json(conn, file_id: str) -> Iterator[bytes]:
+    """Полное сопоставление (JSON, UTF-8) по кускам: сегмент за сегментом"""
+    yield b"{"
+    for index, fragment in enumerate(_iter_segment_data(conn, file_id)):
+        yield b"," + fragment if index else fragment
+    yield b"}"
+
+
+def load_mapping_json(conn, file_id: str) -> Optional[bytes]:
+    """Полное сопоставление в виде готового JSON (UTF-8)"""
+    payload = load_mapping_payload(conn, file_id)
+    if payload is not None:
+        return decode_blob(payload)
+    if load_mapping_meta(conn, file_id) is None:
+        return None
+    return b"".join(iter_mapping_json(conn, file_id))
+
+
+def iter_mapping_paragraphs(conn, file_id: str) -> Iterator[dict]:
+    """Абзацы сопоставления по порядку; в памяти одновременно только один сегмент"""
+    row = conn.execute(
+        text("SELECT mapping_data, paragraph_count FROM files_with_mapping WHERE file_id = :file_id"),
+        {"file_id": file_id}
+    ).fetchone()
+    if row is None:
+        return
+    if row.paragraph_count is None:
+        yield from json.loads(row.mapping_data).values()
+        return
+    for fragment in _iter_segment_data(conn, file_id):
+        yield from json.loads(b"{" + fragment + b"}").values()
+
+
+def load_mapping_range(conn, file_id: str, start: int, end: int) -> Optional[Dict[str, dict]]:
+    """Абзацы с номерами из [start, end): читаются и разбираются только нужные сегменты"""
+    row = conn.execute(
+        text("SELECT mapping_data, paragraph_count, segment_size FROM files_with_mapping WHERE file_id = :file_id"),
+        {"file_id": file_id}
+    ).fetchone()
+    if row is None:
+        return None
+    if row.paragraph_count is None:
+        fragments: List[bytes] = [row.mapping_data.encode("utf-8")[1:-1]]
+    elif end <= start:
+        fragments = []
+    else:
+        fragments = [decode_blob(data) for data in conn.execute(text("""
+            SELECT data FROM mapping_segments
+            WHERE file_id = :file_id AND ordinal BETWEEN :first AND :last
+            ORDER BY ordinal
+        """), {
+            "file_id": file_id,
+            "first": start // row.segment_size,
+            "last": (end - 1) // row.segment_size,
+        }).scalars()]
+    result = {}
+    for fragment in fragments:
+        if not fragment.strip():
+            continue
+        for key, paragraph in json.loads(b"{" + fragment + b"}").items():
+            if start <= int(key) < end:
+                result[key] = paragraph
+    return result
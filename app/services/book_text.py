@@ -0,0 +1,71 @@
+import gzip
+import io
+import shutil
+from typing import BinaryIO, Iterator, List, Sequence, Tuple
+
+from app.services.aligner import Bead
+
+# Тексты книг для подготовки читаются потоком: в памяти одновременно только текущий
+# абзац, поэтому расход памяти не зависит от длины книги.
+GZIP_MAGIC = b"\x1f\x8b"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def save_stream(source: BinaryIO, path: str) -> int:
+    """Копирует загружаемый файл на диск кусками как есть (текст или gzip); возвращает размер"""
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        return target.tell()
+
+
+def open_text(path: str) -> io.TextIOBase:
+    """Открывает текст книги на чтение; сжатие gzip определяется по сигнатуре"""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8-sig")
+    return open(path, "r", encoding="utf-8-sig")
+
+
+def iter_paragraphs(path: str) -> Iterator[str]:
+    """
+    Абзацы текста по порядку. Абзацы разделяются пустой строкой, как при разбиении по
+    '\\n\\n'; пробелы по краям абзаца отбрасываются, пустые абзацы пропускаются.
+    """
+    with open_text(path) as f:
+        lines: List[str] = []
+        for line in f:
+            if line == "\n":
+                paragraph = "".join(lines).strip()
+                if paragraph:
+                    yield paragraph
+                lines = []
+            else:
+                lines.append(line)
+        paragraph = "".join(lines).strip()
+        if paragraph:
+            yield paragraph
+
+
+def paragraph_lengths(path: str) -> List[int]:
+    """Длины абзацев в символах — всё, что нужно выравниванию от первого прохода"""
+    return [len(paragraph) for paragraph in iter_paragraphs(path)]
+
+
+def iter_bead_mapping(
+    beads: Sequence[Bead], english: Iterator[str], russian: Iterator[str]
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Записи сопоставления по бусинам выравнивания (второй проход по текстам). Абзацы
+    одной бусины склеиваются через пустую строку; en/ru — номер первого абзаца и их число.
+    """
+    for i, bead in enumerate(beads):
+        english_paragraphs = [next(english) for _ in range(bead.source_count)]
+        russian_paragraphs = [next(russian) for _ in range(bead.target_count)]
+        yield i, {
+            "english": "\n\n".join(english_paragraphs),
+            "russian": "\n\n".join(russian_paragraphs),
+            "en": [bead.source_start, bead.source_count],
+            "ru": [bead.target_start, bead.target_count],
+            "confidence": round(bead.confidence, 4),
+        }
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+
+from app.core.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Обработчик получает задачу (id, user_id, file_id, params, claim) и функцию отчёта о ходе
+# работы report(progress от 0 до 1, stage); возвращает результат для клиента. Побочные
+# эффекты обработчик фиксирует в транзакции, проверившей hold_claim: поток задачи,
+# которую уже вернули в очередь, не должен ничего записать
+Report = Callable[[float, str], None]
+Handler = Callable[[dict, Report], dict]
+
+# В PostgreSQL воркеры не ждут строку, которую забирает другой воркер, а берут следующую;
+# SQLite сериализует запись сам и такой блокировки не знает
+_SKIP_LOCKED = " FOR UPDATE SKIP LOCKED" if engine.dialect.name == "postgresql" else ""
+
+CLAIM_JOB = text(f"""
+    UPDATE jobs
+    SET status = 'running', claim = :claim, attempts = attempts + 1,
+        heartbeat = :now, started_at = CURRENT_TIMESTAMP
+    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, id LIMIT 1{_SKIP_LOCKED})
+      AND status = 'queued'
+    RETURNING id, kind, user_id, file_id, params
+""")
+
+# Задачи упавшего процесса: без отметок живости дольше stale_timeout возвращаются в
+# очередь, а исчерпавшие попытки считаются проваленными — их входные данные удаляются
+FAIL_LOST_JOBS = text("""
+    UPDATE jobs
+    SET status = 'failed', error = 'Worker lost', finished_at = CURRENT_TIMESTAMP, claim = NULL
+    WHERE status = 'running' AND heartbeat < :cutoff AND attempts >= :max_attempts
+    RETURNING id, kind, user_id, file_id, params
+""")
+REQUEUE_LOST_JOBS = text("""
+    UPDATE jobs
+    SET status = 'queued', claim = NULL
+    WHERE status = 'running' AND heartbeat < :cutoff
+""")
+
+
+def _job_from_row(row) -> dict:
+    job = dict(row._mapping)
+    job["params"] = json.loads(job["params"] or "{}")
+    return job
+
+
+def hold_claim(conn, job: dict) -> bool:
+    """
+    Проверяет в транзакции вызывающего, что задача всё ещё за этим воркером.
+    Строка задачи при этом обновляется и остаётся заблокированной до коммита: вернуть
+    задачу в очередь, пока обработчик сохраняет результат, нельзя.
+    """
+    return conn.execute(
+        text("UPDATE jobs SET heartbeat = :now WHERE id = :id AND claim = :claim"),
+        {"now": time.time(), "id": job["id"], "claim": job["claim"]}
+    ).rowcount > 0
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач в таблице jobs: запрос только ставит задачу и сразу
+    отвечает, пул из concurrency воркеров забирает задачи по очереди и выполняет
+    их в потоках. Задачи переживают перезапуск: незавершённые подхватываются
+    снова, в том числе воркерами других процессов.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        cleanup: Optional[Callable[[dict], None]] = None,
+        concurrency: int = settings.JOBS_CONCURRENCY,
+        poll_interval: float = settings.JOBS_POLL_INTERVAL,
+        stale_timeout: float = settings.JOBS_STALE_TIMEOUT,
+        max_attempts: int = settings.JOBS_MAX_ATTEMPTS,
+    ):
+        self.handlers = handlers
+        self.cleanup = cleanup
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._claims: Set[str] = set()
+
+    def submit(self, conn, kind: str, user_id: str, file_id: Optional[str], params: dict, job_id: Optional[str] = None) -> str:
+        """Ставит задачу в очередь в транзакции вызывающего; после коммита нужно вызвать wake()"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = job_id or str(uuid.uuid4())
+        conn.execute(text("""
+            INSERT INTO jobs (id, kind, user_id, file_id, params)
+            VALUES (:id, :kind, :user_id, :file_id, :params)
+        """), {"id": job_id, "kind": kind, "user_id": user_id, "file_id": file_id, "params": json.dumps(params)})
+        return job_id
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._supervise()))
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _claim(self) -> Optional[dict]:
+        claim = str(uuid.uuid4())
+        with engine.begin() as conn:
+            row = conn.execute(CLAIM_JOB, {"claim": claim, "now": time.time()}).fetchone()
+        if row is None:
+            return None
+        job = _job_from_row(row)
+        job["claim"] = claim
+        return job
+
+    def _update(self, job: dict, values: str, params: dict) -> bool:
+        with engine.begin() as conn:
+            return conn.execute(
+                text(f"UPDATE jobs SET {values} WHERE id = :id AND claim = :claim"),
+                {"id": job["id"], "claim": job["claim"], **params}
+            ).rowcount > 0
+
+    def _reporter(self, job: dict) -> Report:
+        last = {"stage": None, "at": 0.0}
+
+        def report(progress: float, stage: str) -> None:
+            # Ход работы пишем не чаще двух раз в секунду, смену этапа — сразу
+            now = time.monotonic()
+            if stage == last["stage"] and now - last["at"] < 0.5:
+                return
+            last["stage"], last["at"] = stage, now
+            self._update(job, "progress = :progress, stage = :stage", {"progress": min(max(progress, 0.0), 1.0), "stage": stage})
+
+        return report
+
+    def _finish(self, job: dict, values: str, params: dict) -> None:
+        # Если задачу уже вернули в очередь (остановка процесса, потеря отметок живости),
+        # метка воркера сброшена: результат не записывается, входные данные остаются для повтора
+        if self._update(job, values, params) and self.cleanup is not None:
+            self.cleanup(job)
+
+    async def _run(self, job: dict) -> None:
+        self._claims.add(job["claim"])
+        try:
+            result = await asyncio.to_thread(self.handlers[job["kind"]], job, self._reporter(job))
+        except asyncio.CancelledError:
+            # Остановка процесса — не провал задачи: возвращаем её в очередь без траты попытки.
+            # Поток обработчика доработает сам, но его результат уже не будет принят
+            await asyncio.to_thread(
+                self._update, job, "status = 'queued', claim = NULL, attempts = attempts - 1", {}
+            )
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            await asyncio.to_thread(
+                self._finish, job,
+                "status = 'failed', error = :error, finished_at = CURRENT_TIMESTAMP, claim = NULL",
+                {"error": str(e)},
+            )
+        else:
+            await asyncio.to_thread(
+                self._finish, job,
+                "status = 'done', progress = 1, stage = NULL, result = :result, "
+                "finished_at = CURRENT_TIMESTAMP, claim = NULL",
+                {"result": json.dumps(result, ensure_ascii=False)},
+            )
+        finally:
+            self._claims.discard(job["claim"])
+
+    async def _worker(self) -> None:
+        while True:
+            # Сбрасываем сигнал до выборки: задача, поставленная во время неё, разбудит снова
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Error claiming a job: {e}")
+                job = None
+            if job is not None:
+                await self._run(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _heartbeat_and_recover(self) -> Tuple[int, int]:
+        """Возвращает число задач, возвращённых в очередь и проваленных"""
+        now = time.time()
+        params = {"max_attempts": self.max_attempts, "cutoff": now - self.stale_timeout}
+        with engine.begin() as conn:
+            if self._claims:
+                conn.execute(
+                    text("UPDATE jobs SET heartbeat = :now WHERE claim IN :claims").bindparams(
+                        bindparam("claims", expanding=True)
+                    ),
+                    {"now": now, "claims": list(self._claims)}
+                )
+            failed = [_job_from_row(row) for row in conn.execute(FAIL_LOST_JOBS, params).fetchall()]
+            requeued = conn.execute(REQUEUE_LOST_JOBS, params).rowcount
+        if self.cleanup is not None:
+            for job in failed:
+                try:
+                    self.cleanup(job)
+                except Exception as e:
+                    logger.error(f"Error cleaning up lost job {job['id']}: {e}")
+        return requeued, len(failed)
+
+    async def _supervise(self) -> None:
+        """Отметки живости своих задач и возврат в очередь брошенных чужих"""
+        while True:
+            try:
+                recovered, failed = await asyncio.to_thread(self._heartbeat_and_recover)
+                if failed:
+                    logger.warning(f"Failed {failed} abandoned jobs that ran out of attempts")
+                if recovered:
+                    logger.warning(f"Requeued {recovered} abandoned jobs")
+                    self.wake()
+            except Exception as e:
+                logger.error(f"Error in job supervisor: {e}")
+            await asyncio.sleep(min(self.stale_timeout / 3, 30))
+
+    def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        with engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT id, kind, file_id, status, progress, stage, result, error, attempts,
+                       created_at, started_at, finished_at
+                FROM jobs WHERE id = :id AND user_id = :user_id
+            """), {"id": job_id, "user_id": user_id}).fetchone()
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        for field in ("created_at", "started_at", "finished_at"):
+            job[field] = str(job[field]) if job[field] is not None else None
+        return job
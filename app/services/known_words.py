@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Iterable, Tuple
+
+from app.core.config import settings
+
+
+def normalize_word(word: str) -> str:
+    return word.strip().casefold()
+
+
+class KnownWordsCache:
+    """
+    Множества слов пользовательских словарей в памяти процесса (LRU по пользователям).
+    Множество действительно, пока не изменилась версия словаря, поэтому запись
+    из другого процесса тоже его сбрасывает; локальные записи сбрасывают сразу.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._sets: "OrderedDict[str, Tuple[int, FrozenSet[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, user_id: str, version: int, load: Callable[[], Iterable[str]]) -> FrozenSet[str]:
+        with self._lock:
+            cached = self._sets.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._sets.move_to_end(user_id)
+                self.hits += 1
+                return cached[1]
+
+        words = frozenset(normalize_word(word) for word in load())
+        with self._lock:
+            self.loads += 1
+            self._sets[user_id] = (version, words)
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return words
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._sets.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._sets), "hits": self.hits, "loads": self.loads}
+
+
+known_words_cache = KnownWordsCache(settings.DICTIONARY_CACHE_USERS)
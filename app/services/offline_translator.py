@@ -0,0 +1,83 @@
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# Слова (в том числе с апострофами и дефисами) и отдельные знаки препинания
+_TOKEN_RE = re.compile(r"[\w']+(?:-[\w']+)*|[.,!?;:()]")
+# Знаки, которые пишутся слитно с предыдущим словом
+_ATTACHED_PUNCTUATION = frozenset(".,!?;:")
+
+# Правила очистки русского текста: (шаблон, замена)
+RUSSIAN_CLEANUP_RULES: Sequence[Tuple[str, str]] = (
+    # Убираем "и" в начале предложения
+    (r'^\s*[Ии]\s+', ''),
+    # Убираем ошибочные конструкции
+    (r'\sявляется\s+был', ' был'),
+    # Исправляем предлоги
+    (r'\sв\s+в\s', ' в '),
+    (r'\sна\s+на\s', ' на '),
+    # Исправляем местоимения
+    (r'\sего его\s', ' его '),
+    (r'\sих их\s', ' их '),
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+# Правила очистки по целевому языку
+CLEANUP_RULES: Dict[str, Sequence[Tuple[str, str]]] = {
+    "ru": RUSSIAN_CLEANUP_RULES,
+}
+
+
+class OfflineTranslator:
+    """
+    Словарный перевод без сети: поиск самых длинных фраз и однопроходная очистка.
+    matcher — словарь с методом scan(tokens), например MmapDictionary.
+    """
+
+    def __init__(self, matcher, cleanup_rules: Sequence[Tuple[str, str]] = ()):
+        self.matcher = matcher
+        # Все правила очистки собираются в одно регулярное выражение
+        self._replacements = {f"r{index}": replacement for index, (_, replacement) in enumerate(cleanup_rules)}
+        self._cleanup_re = re.compile(
+            "|".join(f"(?P<r{index}>{pattern})" for index, (pattern, _) in enumerate(cleanup_rules))
+        ) if cleanup_rules else None
+
+    @staticmethod
+    def _match_case(original: str, translation: str) -> str:
+        # Сохраняем оригинальный регистр; остальные буквы перевода не трогаем,
+        # чтобы не портить имена собственные вроде "Весёлый Роджер"
+        if original.istitle():
+            return translation[:1].upper() + translation[1:]
+        if original.isupper():
+            return translation.upper()
+        return translation
+
+    def translate(self, text: str) -> str:
+        if not text or text.strip() == "":
+            return ""
+
+        tokens = tokenize(text)
+        parts: List[str] = []
+        for start, end, translation in self.matcher.scan(tokens):
+            original = tokens[start]
+            if translation is None:
+                # Пунктуация и слова, которых нет в словаре, остаются как есть
+                translated = " ".join(tokens[start:end])
+            elif not translation:
+                # Пустой перевод (например, для артиклей) — слово выпадает
+                continue
+            else:
+                translated = self._match_case(original, translation)
+
+            if parts and translated in _ATTACHED_PUNCTUATION:
+                parts[-1] += translated
+            else:
+                parts.append(translated)
+
+        translated_text = " ".join(parts)
+        if self._cleanup_re is not None:
+            translated_text = self._cleanup_re.sub(lambda m: self._replacements[m.lastgroup], translated_text)
+        return translated_text
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _ReaderState:
+    """Где сейчас читатель и какие страницы для него уже переводятся"""
+
+    def __init__(self, user_id: str, file_id: str, page: int, source_lang: str, target_lang: str):
+        self.user_id = user_id
+        self.file_id = file_id
+        self.page = page
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.done = set()
+
+    def cancel(self, pages=None) -> int:
+        cancelled = 0
+        for page, task in list(self.tasks.items()):
+            if pages is None or page in pages:
+                if task.cancel():
+                    cancelled += 1
+                del self.tasks[page]
+        return cancelled
+
+
+class PrefetchScheduler:
+    """
+    Упреждающий перевод следующих страниц файла в кэш. Работает с низким
+    приоритетом: общий лимит одновременных задач, пропуск при занятом пуле
+    бэкенда и бюджет страниц в работе на пользователя.
+    При переходе читателя в другое место его задачи отменяются. Помнятся
+    только max_readers последних читателей, остальные вытесняются вместе с задачами.
+    """
+
+    def __init__(
+        self,
+        translate: Callable[[str, str, str, str], Awaitable],
+        load_page: Callable[[str, int], Optional[str]],
+        is_busy: Callable[[], bool],
+        pages_ahead: int = settings.TRANSLATION_PREFETCH_PAGES,
+        user_budget: int = settings.TRANSLATION_PREFETCH_USER_BUDGET,
+        concurrency: int = settings.TRANSLATION_PREFETCH_CONCURRENCY,
+        max_readers: int = settings.TRANSLATION_PREFETCH_MAX_READERS,
+    ):
+        self.translate = translate
+        self.load_page = load_page
+        self.is_busy = is_busy
+        self.pages_ahead = pages_ahead
+        self.user_budget = user_budget
+        self.max_readers = max_readers
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._readers: "OrderedDict[str, _ReaderState]" = OrderedDict()
+
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.skipped_busy = 0
+        self.failed = 0
+        self.evicted = 0
+
+    async def _prefetch(self, state: _ReaderState, page: int) -> None:
+        async with self._semaphore:
+            # Все потоки пула заняты — не отнимаем их у интерактивных запросов
+            if self.is_busy():
+                self.skipped_busy += 1
+                return
+            text = await asyncio.to_thread(self.load_page, state.file_id, page)
+            if text:
+                await self.translate(text, state.source_lang, state.target_lang, state.user_id)
+            self.completed += 1
+            state.done.add(page)
+
+    def _on_done(self, state: _ReaderState, page: int, task: asyncio.Task) -> None:
+        if state.tasks.get(page) is task:
+            del state.tasks[page]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            logger.warning(f"Prefetch of page {page} in file {state.file_id} failed: {task.exception()}")
+
+    def schedule(self, user_id: str, file_id: str, page: int, source_lang: str, target_lang: str) -> None:
+        if self.pages_ahead <= 0:
+            return
+        state = self._readers.get(user_id)
+        jumped = (
+            state is None
+            or state.file_id != file_id
+            or (state.source_lang, state.target_lang) != (source_lang, target_lang)
+            or not state.page <= page <= state.page + self.pages_ahead
+        )
+        if jumped:
+            if state is not None:
+                self.cancelled += state.cancel()
+            state = _ReaderState(user_id, file_id, page, source_lang, target_lang)
+            self._readers[user_id] = state
+            self._readers.move_to_end(user_id)
+            while len(self._readers) > self.max_readers:
+                _, evicted = self._readers.popitem(last=False)
+                self.cancelled += evicted.cancel()
+                self.evicted += 1
+        else:
+            self._readers.move_to_end(user_id)
+            # Читатель продвинулся вперёд: страницы позади него больше не нужны
+            self.cancelled += state.cancel(range(state.page, page + 1))
+            state.page = page
+
+        for next_page in range(page + 1, page + 1 + self.pages_ahead):
+            if len(state.tasks) >= self.user_budget:
+                break
+            if next_page in state.tasks or next_page in state.done:
+                continue
+            task = asyncio.create_task(self._prefetch(state, next_page))
+            task.add_done_callback(lambda done, p=next_page: self._on_done(state, p, done))
+            state.tasks[next_page] = task
+            self.scheduled += 1
+
+    def cancel_user(self, user_id: str) -> None:
+        state = self._readers.pop(user_id, None)
+        if state is not None:
+            self.cancelled += state.cancel()
+
+    def shutdown(self) -> None:
+        for user_id in list(self._readers):
+            self.cancel_user(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "readers": len(self._readers),
+            "in_flight": sum(len(state.tasks) for state in self._readers.values()),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "skipped_busy": self.skipped_busy,
+            "failed": self.failed,
+            "evicted": self.evicted,
+        }
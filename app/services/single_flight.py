@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом: первый запрос
+    запускает работу, остальные ждут тот же результат или ту же ошибку.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # Помечаем исключение как полученное, даже если все ожидающие отменились
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]], cancel_abandoned: bool = False) -> Any:
+        """
+        cancel_abandoned: если работу начал этот вызов и все ожидающие отменились,
+        работа тоже отменяется (нужно фоновым задачам, которые больше не актуальны)
+        """
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            # Работа идёт отдельной задачей, чтобы отключение первого клиента
+            # не отменяло её для остальных ожидающих
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if leader and cancel_abandoned and self._waiters[key] == 0:
+                    task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,93 @@
+import re
+from typing import Iterator, List, NamedTuple
+
+# Граница абзаца: пустая строка (возможно, с пробелами)
+_PARAGRAPH_RE = re.compile(r'\n[ \t]*\n\s*')
+# Граница предложения: знак конца предложения, закрывающие кавычки/скобки и пробелы
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])["\'»”)\]]*\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class TextChunk(NamedTuple):
+    """Фрагмент текста и исходный разделитель, который шёл после него"""
+    text: str
+    separator: str
+
+
+def _split_keep(text: str, pattern: re.Pattern) -> Iterator[TextChunk]:
+    """Режет текст по шаблону, сохраняя найденные разделители"""
+    position = 0
+    for match in pattern.finditer(text):
+        if match.start() == 0:
+            continue
+        yield TextChunk(text[position:match.start()], match.group(0))
+        position = match.end()
+    if position < len(text):
+        yield TextChunk(text[position:], "")
+
+
+def _split_oversized(piece: TextChunk, max_chars: int) -> Iterator[TextChunk]:
+    """Дробит слишком длинный фрагмент: по предложениям, затем по словам, затем жёстко"""
+    if len(piece.text) <= max_chars:
+        yield piece
+        return
+
+    for pattern in (_SENTENCE_RE, _WHITESPACE_RE):
+        parts = list(_split_keep(piece.text, pattern))
+        if len(parts) > 1:
+            parts[-1] = TextChunk(parts[-1].text, parts[-1].separator + piece.separator)
+            for part in _pack(parts, max_chars):
+                yield from _split_oversized(part, max_chars)
+            return
+
+    # Одно бесконечное «слово» — остаётся только резать по символам
+    text = piece.text
+    for i in range(0, len(text), max_chars):
+        separator = piece.separator if i + max_chars >= len(text) else ""
+        yield TextChunk(text[i:i + max_chars], separator)
+
+
+def _pack(parts: List[TextChunk], max_chars: int) -> Iterator[TextChunk]:
+    """Жадно склеивает соседние фрагменты, пока не превышен лимит"""
+    buffer = ""
+    buffer_separator = ""
+    for part in parts:
+        if buffer and len(buffer) + len(buffer_separator) + len(part.text) <= max_chars:
+            buffer = buffer + buffer_separator + part.text
+            buffer_separator = part.separator
+            continue
+        if buffer:
+            yield TextChunk(buffer, buffer_separator)
+        buffer, buffer_separator = part.text, part.separator
+    if buffer:
+        yield TextChunk(buffer, buffer_separator)
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[TextChunk]:
+    """
+    Делит текст на куски не длиннее max_chars, не разрывая абзацы и предложения
+    без необходимости. Склейка text + separator всех кусков восстанавливает
+    исходный текст без ведущих пробелов.
+    """
+    text = text.lstrip()
+    if not text:
+        return []
+
+    paragraphs = list(_split_keep(text, _PARAGRAPH_RE))
+    chunks = []
+    for paragraph in paragraphs:
+        chunks.extend(_split_oversized(paragraph, max_chars))
+    return list(_pack(chunks, max_chars))
+
+
+def split_paragraphs(text: str) -> List[TextChunk]:
+    """Делит текст на абзацы, сохраняя разделители между ними"""
+    text = text.lstrip()
+    if not text:
+        return []
+    return list(_split_keep(text, _PARAGRAPH_RE))
+
+
+def join_chunks(chunks: List[TextChunk], translations: List[str]) -> str:
+    """Собирает переведённые куски в исходном порядке с исходными разделителями"""
+    return "".join(translated + chunk.separator for chunk, translated in zip(chunks, translations)).strip()
@@ -0,0 +1,442 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.services.single_flight import SingleFlight
+from app.services.text_chunker import TextChunk, join_chunks, split_into_chunks, split_paragraphs
+from app.services.translation_cache import TranslationCache, make_cache_key, translation_cache
+from app.services.translation_executor import (
+    TranslationExecutors,
+    TranslationOverloaded,
+    TranslationTimeout,
+    translation_executors,
+)
+from app.services.translation_memory import TranslationMemory, translation_memory
+
+logger = logging.getLogger(__name__)
+
+
+def _log_background_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background translation failed: {task.exception()}")
+
+
+class TranslationService:
+    """
+    Конвейер перевода: память переводов пользователя -> общий кэш -> разбиение на куски
+    по границам предложений -> параллельный перевод кусков во внешнем сервисе -> сборка
+    в исходном порядке. В общий кэш попадают только переводы внешнего сервиса.
+    Одинаковые одновременные запросы разделяют один вызов внешнего сервиса,
+    а короткие сегменты пакетного запроса упаковываются в минимум вызовов.
+    Если внешний сервис падает на куске, этот кусок переводится запасным словарём.
+    Если сервис не отвечает на короткий текст (не длиннее hedge_max_length) дольше
+    hedge_budget, клиент сразу получает словарный перевод (degraded), а ответ
+    сервиса досчитывается в фоне и попадает в кэш. Длинные тексты ждут сервис до дедлайна.
+    После серии ошибок предохранитель на время отключает внешний сервис.
+    """
+
+    def __init__(
+        self,
+        upstream: Callable[[str, str, str], str],
+        fallback: Callable[[str, str, str], str],
+        cache: TranslationCache = translation_cache,
+        executors: TranslationExecutors = translation_executors,
+        backend: str = "google",
+        chunk_size: int = settings.TRANSLATION_CHUNK_SIZE,
+        parallelism: int = settings.TRANSLATION_CHUNK_PARALLELISM,
+        stream_chunk_size: int = settings.TRANSLATION_STREAM_CHUNK_SIZE,
+        hedge_budget: float = settings.TRANSLATION_HEDGE_BUDGET,
+        hedge_max_length: int = settings.TRANSLATION_HEDGE_MAX_LENGTH,
+        breaker: Optional[CircuitBreaker] = None,
+        memory: Optional[TranslationMemory] = translation_memory,
+    ):
+        self.upstream = upstream
+        self.fallback = fallback
+        self.cache = cache
+        self.memory = memory
+        self.executors = executors
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.stream_chunk_size = stream_chunk_size
+        self.hedge_budget = hedge_budget
+        self.hedge_max_length = hedge_max_length
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.TRANSLATION_BREAKER_THRESHOLD,
+            reset_timeout=settings.TRANSLATION_BREAKER_RESET_TIMEOUT,
+        )
+        self.single_flight = SingleFlight()
+        self.hedged = 0
+
+    async def _call_upstream(self, text: str, source_lang: str, target_lang: str) -> str:
+        """Один вызов внешнего сервиса через пул бэкенда с учётом предохранителя"""
+        if not self.breaker.allow():
+            raise CircuitOpen(f"Translation backend '{self.backend}' is temporarily disabled")
+        try:
+            translated = await self.executors.run(self.backend, self.upstream, text, source_lang, target_lang)
+        except (TranslationOverloaded, asyncio.CancelledError):
+            # Переполнена наша собственная очередь или вызов отменён — внешний сервис тут ни при чём
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return translated
+
+    async def _translate_chunk(
+        self, chunk: TextChunk, source_lang: str, target_lang: str, semaphore: asyncio.Semaphore
+    ) -> Tuple[str, bool]:
+        async with semaphore:
+            try:
+                translated = await self._call_upstream(chunk.text, source_lang, target_lang)
+                if translated:
+                    return translated, True
+                logger.error("DeepTranslator returned empty result")
+            except (TranslationOverloaded, TranslationTimeout):
+                raise
+            except CircuitOpen:
+                pass
+            except Exception as e:
+                logger.error(f"DeepTranslator error: {str(e)}")
+        # Внешний сервис не справился — используем локальный словарь
+        return self.fallback(chunk.text, source_lang, target_lang), False
+
+    async def _lookup_local(
+        self, text: str, source_lang: str, target_lang: str, user_id: Optional[str]
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Ищет готовый перевод без сети: сначала в памяти переводов пользователя, затем
+        в общем кэше. Второй элемент — перевод взят из личной памяти пользователя.
+        """
+        if self.memory is not None and user_id is not None:
+            # Нечёткий поиск и загрузка памяти пользователя не должны занимать цикл событий
+            remembered, composed = await asyncio.to_thread(
+                self._lookup_memory, text, source_lang, target_lang, user_id
+            )
+            if remembered is not None:
+                return remembered, True
+            # Абзацы из памяти пользователя важнее общего кэша: такой текст собирается заново
+            if composed:
+                return None, False
+        return await self.cache.get(text, source_lang, target_lang), False
+
+    def _lookup_memory(
+        self, text: str, source_lang: str, target_lang: str, user_id: str
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Перевод всего текста из памяти пользователя, а если его нет — признак того,
+        что в памяти есть отдельные абзацы текста
+        """
+        # Текст из нескольких абзацев нечётко сравнивается по абзацам (_split_by_memory):
+        # иначе близость одного длинного абзаца «съедает» остальные
+        single = len(split_paragraphs(text)) <= 1
+        remembered = self.memory.lookup(text, source_lang, target_lang, user_id, fuzzy=single)
+        if remembered is not None or single:
+            return remembered, False
+        return None, any(
+            found is not None for _, found, _ in self._split_by_memory(text, source_lang, target_lang, user_id)
+        )
+
+    async def translate(
+        self, text: str, source_lang: str = "en", target_lang: str = "ru", user_id: Optional[str] = None
+    ) -> str:
+        translated, _ = await self.translate_with_status(text, source_lang, target_lang, user_id)
+        return translated
+
+    async def translate_with_status(
+        self, text: str, source_lang: str = "en", target_lang: str = "ru", user_id: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        """
+        Возвращает перевод и признак того, что он получен от внешнего сервиса.
+        Память переводов используется только для пользователя user_id.
+        """
+        translated, from_upstream, _ = await self._translate(text, source_lang, target_lang, user_id)
+        return translated, from_upstream
+
+    async def _translate(
+        self, text: str, source_lang: str, target_lang: str, user_id: Optional[str]
+    ) -> Tuple[str, bool, bool]:
+        """Перевод, признак ответа внешнего сервиса и признак участия личной памяти"""
+        if not text or text.strip() == "":
+            return "", True, False
+
+        cached, personal = await self._lookup_local(text, source_lang, target_lang, user_id)
+        if cached is not None:
+            return cached, True, personal
+
+        work = asyncio.ensure_future(self._translate_uncached(text, source_lang, target_lang, user_id))
+        if not self.hedge_budget or len(text) > self.hedge_max_length:
+            return await work
+
+        done, _ = await asyncio.wait({work}, timeout=self.hedge_budget)
+        if work in done:
+            return work.result()
+
+        # Сервис не уложился в бюджет: отдаём словарный перевод, а ответ сервиса
+        # дождёмся в фоне — он попадёт в кэш для следующих запросов
+        self.hedged += 1
+        work.add_done_callback(_log_background_failure)
+        return self.fallback(text, source_lang, target_lang), False, False
+
+    async def warm(
+        self, text: str, source_lang: str = "en", target_lang: str = "ru", user_id: Optional[str] = None
+    ) -> bool:
+        """
+        Заранее переводит текст в кэш без подстраховки словарём: фоновому
+        прогреву незачем отдавать ответ быстро. True, если перевод уже был.
+        """
+        if not text or text.strip() == "":
+            return True
+        cached, _ = await self._lookup_local(text, source_lang, target_lang, user_id)
+        if cached is not None:
+            return True
+        # Если читатель ушёл и страницу никто не ждёт, отмена прогрева снимает и работу
+        await self._translate_uncached(text, source_lang, target_lang, user_id, cancel_abandoned=True)
+        return False
+
+    def _split_by_memory(
+        self, text: str, source_lang: str, target_lang: str, user_id: Optional[str]
+    ) -> List[Tuple[str, Optional[str], str]]:
+        """
+        Делит текст на участки (source, translation, separator): абзацы, найденные
+        в памяти переводов пользователя, и склеенные подряд идущие абзацы, которых там нет.
+        """
+        if self.memory is None or user_id is None:
+            return [(text.lstrip(), None, "")]
+        parts: List[Tuple[str, Optional[str], str]] = []
+        for paragraph in split_paragraphs(text):
+            remembered = self.memory.lookup(paragraph.text, source_lang, target_lang, user_id)
+            if remembered is None and parts and parts[-1][1] is None:
+                previous, _, previous_separator = parts[-1]
+                parts[-1] = (previous + previous_separator + paragraph.text, None, paragraph.separator)
+            else:
+                parts.append((paragraph.text, remembered, paragraph.separator))
+        return parts
+
+    async def _translate_shared(
+        self, text: str, source_lang: str, target_lang: str, semaphore: asyncio.Semaphore,
+        cancel_abandoned: bool = False,
+    ) -> Tuple[str, bool]:
+        """
+        Перевод без личной памяти: одинаковые одновременные запросы любых пользователей
+        разделяют один вызов, а ответ внешнего сервиса попадает в общий кэш
+        """
+        key = make_cache_key(text, source_lang, target_lang)
+        return await self.single_flight.do(
+            key, lambda: self._translate_fresh(text, source_lang, target_lang, semaphore),
+            cancel_abandoned=cancel_abandoned,
+        )
+
+    async def _translate_fresh(
+        self, text: str, source_lang: str, target_lang: str, semaphore: asyncio.Semaphore
+    ) -> Tuple[str, bool]:
+        chunks = split_into_chunks(text, self.chunk_size)
+        results: List[Tuple[str, bool]] = await asyncio.gather(*(
+            self._translate_chunk(chunk, source_lang, target_lang, semaphore) for chunk in chunks
+        ))
+        translated_text = join_chunks(chunks, [translated for translated, _ in results]).strip()
+        from_upstream = all(ok for _, ok in results)
+
+        # Кэшируем только ответы внешнего сервиса, но не результат запасного словаря
+        if translated_text and from_upstream:
+            await self.cache.set(text, source_lang, target_lang, translated_text)
+        return translated_text, from_upstream
+
+    async def _translate_uncached(
+        self, text: str, source_lang: str, target_lang: str, user_id: Optional[str],
+        cancel_abandoned: bool = False,
+    ) -> Tuple[str, bool, bool]:
+        semaphore = asyncio.Semaphore(self.parallelism)
+        parts = await asyncio.to_thread(self._split_by_memory, text, source_lang, target_lang, user_id)
+        if all(remembered is None for _, remembered, _ in parts):
+            translated_text, from_upstream = await self._translate_shared(
+                text, source_lang, target_lang, semaphore, cancel_abandoned
+            )
+            return translated_text, from_upstream, False
+
+        async def translate_part(source: str, remembered: Optional[str]) -> Tuple[str, bool]:
+            if remembered is not None:
+                return remembered, True
+            cached = await self.cache.get(source, source_lang, target_lang)
+            if cached is not None:
+                return cached, True
+            return await self._translate_shared(source, source_lang, target_lang, semaphore, cancel_abandoned)
+
+        results = await asyncio.gather(*(translate_part(source, remembered) for source, remembered, _ in parts))
+        translated_text = "".join(
+            translated + separator for (translated, _), (_, _, separator) in zip(results, parts)
+        ).strip()
+        # В ответе есть абзацы из личной памяти, поэтому целиком в общий кэш он не кладётся:
+        # там остаются только участки, переведённые сервисом
+        return translated_text, all(ok for _, ok in results), True
+
+    # Пакетный перевод
+    def _pack_segments(self, items: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """Жадно собирает однострочные сегменты в пачки не длиннее лимита API"""
+        packs: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        length = 0
+        for key, text in items:
+            extra = len(text) + (1 if current else 0)
+            if current and length + extra > self.chunk_size:
+                packs.append(current)
+                current, length = [], 0
+                extra = len(text)
+            current.append((key, text))
+            length += extra
+        if current:
+            packs.append(current)
+        return packs
+
+    async def _translate_single(
+        self, item: Tuple[str, str], source_lang: str, target_lang: str, user_id: Optional[str]
+    ) -> List[Tuple[str, dict]]:
+        key, text = item
+        try:
+            translated, from_upstream = await self.translate_with_status(text, source_lang, target_lang, user_id)
+        except (TranslationOverloaded, TranslationTimeout) as e:
+            return [(key, {"translated_text": None, "status": "error", "error": str(e)})]
+        return [(key, {"translated_text": translated, "status": "ok" if from_upstream else "fallback"})]
+
+    async def _translate_pack(
+        self, pack: List[Tuple[str, str]], source_lang: str, target_lang: str, semaphore: asyncio.Semaphore,
+        user_id: Optional[str],
+    ) -> List[Tuple[str, dict]]:
+        if len(pack) == 1:
+            return await self._translate_single(pack[0], source_lang, target_lang, user_id)
+
+        try:
+            async with semaphore:
+                translated = await self._call_upstream(
+                    "\n".join(text for _, text in pack), source_lang, target_lang
+                )
+        except (TranslationOverloaded, TranslationTimeout) as e:
+            return [(key, {"translated_text": None, "status": "error", "error": str(e)}) for key, _ in pack]
+        except Exception as e:
+            if not isinstance(e, CircuitOpen):
+                logger.error(f"DeepTranslator error: {str(e)}")
+            return [
+                (key, {"translated_text": self.fallback(text, source_lang, target_lang), "status": "fallback"})
+                for key, text in pack
+            ]
+
+        parts = translated.split("\n") if translated else []
+        if len(parts) != len(pack):
+            # Сервис склеил или разбил строки — переводим сегменты пачки по отдельности
+            logger.warning(f"Batch pack of {len(pack)} segments came back as {len(parts)} lines, retrying one by one")
+            outcomes = await asyncio.gather(*(
+                self._translate_single(item, source_lang, target_lang, user_id) for item in pack
+            ))
+            return [result for outcome in outcomes for result in outcome]
+
+        parts = [part.strip() for part in parts]
+        await self.cache.set_many(
+            (text, source_lang, target_lang, part) for (_, text), part in zip(pack, parts)
+        )
+        return [(key, {"translated_text": part, "status": "ok"}) for (key, _), part in zip(pack, parts)]
+
+    async def translate_batch(self, segments: List[Tuple[str, str, str]], user_id: Optional[str] = None) -> List[dict]:
+        """
+        Переводит список сегментов (text, source_lang, target_lang). Ответы берутся
+        из памяти переводов user_id и кэша, где это возможно; промахи упаковываются в минимум вызовов внешнего
+        сервиса. Результаты возвращаются в исходном порядке со статусом для каждого.
+        """
+        results: List[Optional[dict]] = [None] * len(segments)
+        pending: Dict[str, List[int]] = {}
+        groups: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+
+        for index, (text, source_lang, target_lang) in enumerate(segments):
+            if not text or text.strip() == "":
+                results[index] = {"translated_text": "", "status": "ok", "cached": False}
+                continue
+            cached, _ = await self._lookup_local(text, source_lang, target_lang, user_id)
+            if cached is not None:
+                results[index] = {"translated_text": cached, "status": "ok", "cached": True}
+                continue
+            key = make_cache_key(text, source_lang, target_lang)
+            if key not in pending:
+                pending[key] = []
+                groups.setdefault((source_lang, target_lang), []).append((key, text.strip()))
+            pending[key].append(index)
+
+        semaphore = asyncio.Semaphore(self.parallelism)
+        jobs = []
+        for (source_lang, target_lang), items in groups.items():
+            # Многострочные и длинные сегменты нельзя склеивать через перевод строки
+            packable, single = [], []
+            for item in items:
+                text = item[1]
+                if "\n" in text or "\r" in text or len(text) > self.chunk_size:
+                    single.append(item)
+                else:
+                    packable.append(item)
+            for pack in self._pack_segments(packable):
+                jobs.append(self._translate_pack(pack, source_lang, target_lang, semaphore, user_id))
+            for item in single:
+                jobs.append(self._translate_single(item, source_lang, target_lang, user_id))
+
+        for outcome in await asyncio.gather(*jobs):
+            for key, result in outcome:
+                for index in pending[key]:
+                    results[index] = dict(result, cached=False)
+        return results
+
+    # Потоковый перевод
+    async def translate_stream(
+        self, text: str, source_lang: str = "en", target_lang: str = "ru", user_id: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Переводит текст по абзацам и отдаёт каждый кусок, как только он готов.
+        Куски могут приходить не по порядку: клиент собирает их по seq,
+        добавляя после каждого исходный разделитель separator.
+        """
+        if not text or text.strip() == "":
+            return
+
+        cached, _ = await self._lookup_local(text, source_lang, target_lang, user_id)
+        if cached is not None:
+            yield {"seq": 0, "total": 1, "translated_text": cached, "separator": "", "status": "ok"}
+            return
+
+        chunks = split_into_chunks(text, self.stream_chunk_size)
+        semaphore = asyncio.Semaphore(self.parallelism)
+        personal = False
+
+        async def translate_chunk(seq: int, chunk: TextChunk) -> Tuple[int, dict]:
+            nonlocal personal
+            async with semaphore:
+                try:
+                    translated, from_upstream, from_memory = await self._translate(
+                        chunk.text, source_lang, target_lang, user_id
+                    )
+                    personal = personal or from_memory
+                except (TranslationOverloaded, TranslationTimeout) as e:
+                    return seq, {"translated_text": None, "status": "error", "error": str(e)}
+            return seq, {"translated_text": translated, "status": "ok" if from_upstream else "fallback"}
+
+        tasks = [asyncio.ensure_future(translate_chunk(seq, chunk)) for seq, chunk in enumerate(chunks)]
+        translations: List[Optional[str]] = [None] * len(chunks)
+        all_upstream = True
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                seq, result = await next_done
+                translations[seq] = result["translated_text"]
+                all_upstream = all_upstream and result["status"] == "ok"
+                yield dict(result, seq=seq, total=len(chunks), separator=chunks[seq].separator)
+        finally:
+            # Клиент отключился — незавершённые куски больше никому не нужны
+            for task in tasks:
+                task.cancel()
+
+        # Текст с переводами из личной памяти пользователя в общий кэш не попадает
+        if all_upstream and not personal:
+            await self.cache.set(text, source_lang, target_lang, join_chunks(chunks, translations))
+
+    def stats(self) -> dict:
+        return {
+            "hedged": self.hedged,
+            "breaker": self.breaker.stats(),
+        }
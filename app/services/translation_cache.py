@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Пробелы и табуляции внутри строки схлопываем, переводы строк сохраняем,
+# чтобы не смешивать тексты с разной разбивкой на абзацы
+_INLINE_SPACES_RE = re.compile(r'[ \t\f\v]+')
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к каноническому виду для ключа кэша"""
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _INLINE_SPACES_RE.sub(" ", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+
+def make_cache_key(text: str, source_lang: str, target_lang: str) -> str:
+    """Ключ кэша: хеш от (нормализованный текст, source_lang, target_lang)"""
+    raw = f"{source_lang}\x1f{target_lang}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    Двухуровневый кэш переводов: LRU в памяти процесса с ограничением
+    по размеру и TTL, за которым стоит таблица SQLite, переживающая рестарты.
+    Обращения к SQLite блокируют, поэтому идут в потоках, а не в event loop;
+    просроченные строки удаляет purge_expired.
+    """
+
+    def __init__(self, db_path: str, max_size: int, ttl: int, db_ttl: int):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_ttl = db_ttl
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._db_ready = False
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_evictions = 0
+
+    # Работа с SQLite-уровнем
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._db_ready:
+            self._init_db(conn)
+        return conn
+
+    def _init_db(self, conn: sqlite3.Connection) -> None:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS translation_cache (
+            cache_key TEXT PRIMARY KEY,
+            source_lang TEXT NOT NULL,
+            target_lang TEXT NOT NULL,
+            translated_text TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''')
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_translation_cache_created_at ON translation_cache (created_at)"
+        )
+        conn.commit()
+        self._db_ready = True
+
+    def _db_get(self, key: str) -> Optional[str]:
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT translated_text, created_at FROM translation_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Translation cache read error: {e}")
+            return None
+        if not row:
+            return None
+        if time.time() - row[1] > self.db_ttl:
+            return None
+        return row[0]
+
+    def _db_set(self, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Записывает строки (key, source_lang, target_lang, value) одной транзакцией"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translation_cache "
+                "(cache_key, source_lang, target_lang, translated_text, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, source_lang, target_lang, value, now) for key, source_lang, target_lang, value in rows]
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Translation cache write error: {e}")
+
+    def purge_expired(self) -> int:
+        """Удаляет из SQLite строки старше db_ttl; возвращает их число"""
+        try:
+            conn = self._connection()
+            removed = conn.execute(
+                "DELETE FROM translation_cache WHERE created_at < ?", (time.time() - self.db_ttl,)
+            ).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Translation cache purge error: {e}")
+            return 0
+        with self._lock:
+            self.db_evictions += removed
+        return removed
+
+    # Работа с уровнем в памяти
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Публичный интерфейс
+    async def get(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        key = make_cache_key(text, source_lang, target_lang)
+
+        value = self._memory_get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+
+        value = await asyncio.to_thread(self._db_get, key)
+        if value is not None:
+            with self._lock:
+                self.db_hits += 1
+            self._memory_set(key, value)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, text: str, source_lang: str, target_lang: str, value: str) -> None:
+        await self.set_many([(text, source_lang, target_lang, value)])
+
+    async def set_many(self, items: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Кладёт в кэш переводы (text, source_lang, target_lang, value); в SQLite — одной транзакцией"""
+        rows = []
+        for text, source_lang, target_lang, value in items:
+            key = make_cache_key(text, source_lang, target_lang)
+            self._memory_set(key, value)
+            rows.append((key, source_lang, target_lang, value))
+        if rows:
+            await asyncio.to_thread(self._db_set, rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.memory_hits + self.db_hits,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "db_evictions": self.db_evictions,
+        }
+
+
+translation_cache = TranslationCache(
+    db_path=settings.TRANSLATION_CACHE_DB,
+    max_size=settings.TRANSLATION_CACHE_SIZE,
+    ttl=settings.TRANSLATION_CACHE_TTL,
+    db_ttl=settings.TRANSLATION_CACHE_DB_TTL,
+)
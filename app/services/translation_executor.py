@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationOverloaded(Exception):
+    """Очередь бэкенда переполнена, запрос отклонён без ожидания"""
+
+
+class TranslationTimeout(Exception):
+    """Перевод не уложился в отведённый дедлайн"""
+
+
+def parse_backend_limits(value: str) -> Dict[str, int]:
+    """Разбирает строку вида "google=8,offline=2" в словарь лимитов"""
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        limits[name.strip()] = max(1, int(limit))
+    return limits
+
+
+class BackendExecutor:
+    """
+    Ограниченный пул потоков для блокирующих вызовов одного бэкенда перевода.
+    Держит лимит одновременных вызовов и длину очереди, считает метрики.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"translate-{name}")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def _call(self, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            result = func()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        else:
+            with self._lock:
+                self.completed += 1
+            return result
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _withdraw(self, future) -> None:
+        """Снимает задачу, ещё ждущую в очереди пула; запущенная доработает в фоне"""
+        if future.cancel():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise TranslationOverloaded(f"Translation backend '{self.name}' is overloaded")
+            self.queued += 1
+
+        call = functools.partial(func, *args, **kwargs)
+        try:
+            future = self._pool.submit(self._call, call)
+        except RuntimeError:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.CancelledError:
+            # Ожидающего отменили (клиент ушёл, прогрев снят): снятая из очереди задача
+            # до _call не дойдёт, поэтому место в очереди освобождаем здесь
+            self._withdraw(future)
+            raise
+        except asyncio.TimeoutError:
+            self._withdraw(future)
+            with self._lock:
+                self.timeouts += 1
+            raise TranslationTimeout(f"Translation backend '{self.name}' timed out after {timeout}s")
+
+    def saturated(self) -> bool:
+        """Все потоки пула заняты: новый вызов встанет в очередь"""
+        with self._lock:
+            return self.active >= self.max_workers
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TranslationExecutors:
+    """Реестр пулов по бэкендам с лимитами из настроек"""
+
+    def __init__(self, limits: Dict[str, int], default_workers: int, max_queue: int, deadline: float):
+        self.limits = limits
+        self.default_workers = default_workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._executors: Dict[str, BackendExecutor] = {}
+        self._lock = threading.Lock()
+
+    def get(self, backend: str) -> BackendExecutor:
+        with self._lock:
+            executor = self._executors.get(backend)
+            if executor is None:
+                workers = self.limits.get(backend, self.default_workers)
+                executor = BackendExecutor(backend, workers, self.max_queue)
+                self._executors[backend] = executor
+            return executor
+
+    async def run(self, backend: str, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        if timeout is None:
+            timeout = self.deadline
+        return await self.get(backend).run(func, *args, timeout=timeout, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            executors = dict(self._executors)
+        return {name: executor.stats() for name, executor in executors.items()}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown()
+
+
+translation_executors = TranslationExecutors(
+    limits=parse_backend_limits(settings.TRANSLATION_BACKEND_CONCURRENCY),
+    default_workers=settings.TRANSLATION_DEFAULT_CONCURRENCY,
+    max_queue=settings.TRANSLATION_MAX_QUEUE,
+    deadline=settings.TRANSLATION_DEADLINE,
+)
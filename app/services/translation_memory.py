@@ -0,0 +1,270 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class MemoryItem(NamedTuple):
+    """
+    Пара переводов для памяти: origin определяет, чью запись заменять или удалять,
+    owner — пользователь, чьим переводам запись может отвечать
+    """
+    origin: str
+    owner: str
+    source_text: str
+    translation: str
+    source_lang: str
+    target_lang: str
+    fuzzy: bool = True
+
+
+def _normalize(text: str) -> str:
+    # Переносы строк в тексте страницы PDF и подготовленной книги почти всегда расходятся
+    return " ".join(text.split()).casefold()
+
+
+def _shingles(normalized: str, size: int) -> Set[str]:
+    words = _WORD_RE.findall(normalized)
+    if len(words) < size:
+        return set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+# Ключи индекса: (owner, source_lang, target_lang, текст или шингл)
+_Key = Tuple[str, str, str, str]
+
+
+class _Index:
+    """Точный словарь и инвертированный индекс шинглов для нечёткого поиска"""
+
+    def __init__(self):
+        self.exact: Dict[_Key, Tuple[str, str]] = {}
+        # entry_id -> (translation, число шинглов) или None для удалённых
+        self.entries: List[Optional[Tuple[str, int]]] = []
+        self.postings: Dict[_Key, List[int]] = defaultdict(list)
+        self.by_origin: Dict[str, List[Tuple[_Key, Optional[int]]]] = defaultdict(list)
+        self.size = 0
+        self.loaded_at = time.monotonic()
+
+
+class _Load:
+    """Идущая загрузка записей пользователя и изменения, пришедшие во время неё"""
+
+    def __init__(self):
+        self.journal: List[Tuple[str, List[MemoryItem]]] = []
+        self.done = threading.Event()
+
+
+class TranslationMemory:
+    """
+    Память переводов из подготовленных книг и пользовательских словарей.
+    Точное совпадение ищется по нормализованному тексту, нечёткое — по
+    коэффициенту Дайса над словесными шинглами, с порогом threshold.
+    Записи личные: пользователю отвечают только его книги и его словарь.
+
+    С loader(owner) индекс пользователя читается при первом обращении и
+    перечитывается через ttl секунд, чтобы видеть изменения из других воркеров;
+    в памяти держатся индексы не более max_owners недавних пользователей.
+    Без loader память заполняется только через replace.
+    """
+
+    def __init__(
+        self, shingle_size: int, threshold: float, min_fuzzy_words: int, max_postings: int = 5000,
+        loader: Optional[Callable[[str], Iterable[MemoryItem]]] = None,
+        max_owners: int = 1000, ttl: float = 300,
+    ):
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.min_fuzzy_words = min_fuzzy_words
+        self.max_postings = max_postings
+        self.loader = loader
+        self.max_owners = max_owners
+        self.ttl = ttl
+        self._owners: "OrderedDict[str, _Index]" = OrderedDict()
+        self._loading: Dict[str, _Load] = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _add(self, index: _Index, item: MemoryItem) -> None:
+        normalized = _normalize(item.source_text)
+        translation = item.translation.strip()
+        if not normalized or not translation:
+            return
+        key = (item.owner, item.source_lang, item.target_lang, normalized)
+        index.exact[key] = (translation, item.origin)
+
+        entry_id = None
+        shingles = _shingles(normalized, self.shingle_size) if item.fuzzy else set()
+        if len(shingles) + self.shingle_size - 1 >= self.min_fuzzy_words:
+            entry_id = len(index.entries)
+            index.entries.append((translation, len(shingles)))
+            for shingle in shingles:
+                index.postings[(item.owner, item.source_lang, item.target_lang, shingle)].append(entry_id)
+        index.by_origin[item.origin].append((key, entry_id))
+        index.size += 1
+
+    def _remove(self, index: _Index, origin: str) -> None:
+        for key, entry_id in index.by_origin.pop(origin, ()):
+            if key in index.exact and index.exact[key][1] == origin:
+                del index.exact[key]
+            if entry_id is not None:
+                # Списки в индексе не чистим: удалённая запись просто не выигрывает
+                index.entries[entry_id] = None
+            index.size -= 1
+
+    def _apply(self, index: _Index, origin: str, items: List[MemoryItem]) -> None:
+        self._remove(index, origin)
+        for item in items:
+            self._add(index, item)
+
+    def replace(self, owner: str, origin: str, items: Iterable[MemoryItem]) -> None:
+        """
+        Заменяет все записи origin пользователя owner (например, после повторной
+        подготовки книги). Незагруженный индекс не трогаем: его загрузка прочитает
+        уже сохранённое изменение, а идущая загрузка получит его из журнала.
+        """
+        items = list(items)
+        with self._lock:
+            index = self._owners.get(owner)
+            if index is None and self.loader is None:
+                index = self._store(owner, _Index())
+            if index is not None:
+                self._apply(index, origin, items)
+            load = self._loading.get(owner)
+            if load is not None:
+                load.journal.append((origin, items))
+
+    def remove(self, owner: str, origin: str) -> None:
+        self.replace(owner, origin, ())
+
+    def _store(self, owner: str, index: _Index) -> _Index:
+        self._owners[owner] = index
+        self._owners.move_to_end(owner)
+        while len(self._owners) > self.max_owners:
+            self._owners.popitem(last=False)
+            self.evictions += 1
+        return index
+
+    def _owner_index(self, owner: str) -> Optional[_Index]:
+        """
+        Индекс пользователя: загружает его при первом обращении и по истечении ttl.
+        Пока индекс перечитывается, остальные запросы отвечают по прежнему.
+        """
+        while True:
+            with self._lock:
+                index = self._owners.get(owner)
+                if index is not None:
+                    self._owners.move_to_end(owner)
+                    if self.loader is None or time.monotonic() - index.loaded_at < self.ttl:
+                        return index
+                if self.loader is None:
+                    return None
+                load = self._loading.get(owner)
+                if load is None:
+                    load = self._loading[owner] = _Load()
+                    break
+                if index is not None:
+                    return index
+            load.done.wait()
+
+        try:
+            fresh = _Index()
+            for item in self.loader(owner):
+                self._add(fresh, item)
+        except Exception as e:
+            logger.error(f"Error loading translation memory for user {owner}: {e}")
+            fresh = None
+        with self._lock:
+            del self._loading[owner]
+            if fresh is not None:
+                # Изменения, сделанные во время загрузки, могли не попасть в прочитанное
+                for origin, items in load.journal:
+                    self._apply(fresh, origin, items)
+                index = self._store(owner, fresh)
+                self.loads += 1
+        load.done.set()
+        return index
+
+    def lookup(
+        self, text: str, source_lang: str, target_lang: str, owner: Optional[str], fuzzy: bool = True
+    ) -> Optional[str]:
+        """
+        Перевод из записей пользователя owner; без пользователя память не используется.
+        Может читать базу через loader, поэтому вызывается из потока, а не из цикла событий.
+        """
+        normalized = _normalize(text)
+        if not normalized or owner is None:
+            return None
+        index = self._owner_index(owner)
+        if index is None:
+            self.misses += 1
+            return None
+
+        exact = index.exact.get((owner, source_lang, target_lang, normalized))
+        if exact is not None:
+            self.exact_hits += 1
+            return exact[0]
+
+        shingles = _shingles(normalized, self.shingle_size) if fuzzy else set()
+        if len(shingles) + self.shingle_size - 1 < self.min_fuzzy_words:
+            self.misses += 1
+            return None
+
+        counts: Counter = Counter()
+        for shingle in shingles:
+            posting = index.postings.get((owner, source_lang, target_lang, shingle))
+            # Слишком частые шинглы почти ничего не различают и только тормозят поиск
+            if posting and len(posting) <= self.max_postings:
+                counts.update(posting)
+
+        best_score, best_translation = 0.0, None
+        for entry_id, shared in counts.items():
+            entry = index.entries[entry_id]
+            if entry is None:
+                continue
+            translation, entry_shingles = entry
+            score = 2.0 * shared / (len(shingles) + entry_shingles)
+            if score > best_score:
+                best_score, best_translation = score, translation
+
+        if best_translation is not None and best_score >= self.threshold:
+            self.fuzzy_hits += 1
+            return best_translation
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = sum(index.size for index in self._owners.values())
+            owners = len(self._owners)
+        return {
+            "owners": owners,
+            "entries": entries,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+
+translation_memory = TranslationMemory(
+    shingle_size=settings.TRANSLATION_MEMORY_SHINGLE_SIZE,
+    threshold=settings.TRANSLATION_MEMORY_THRESHOLD,
+    min_fuzzy_words=settings.TRANSLATION_MEMORY_MIN_WORDS,
+    max_owners=settings.TRANSLATION_MEMORY_MAX_USERS,
+    ttl=settings.TRANSLATION_MEMORY_REFRESH,
+)
@@ -0,0 +1,131 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+import requests
+from bs4 import BeautifulSoup
+from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых имеет смысл повторить запрос
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, TooManyRequests, RequestError)
+
+
+class TranslatorBackend(ABC):
+    """Интерфейс бэкенда перевода: один блокирующий вызов на кусок текста"""
+
+    name = "base"
+
+    @abstractmethod
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class GoogleWebBackend(TranslatorBackend):
+    """
+    Мобильная версия Google Translate (тот же протокол, что у deep-translator),
+    но через общий пул HTTP-соединений с keep-alive, таймаутами и повторами.
+    """
+
+    name = "google"
+
+    def __init__(
+        self,
+        base_url: str = "https://translate.google.com/m",
+        pool_size: int = settings.TRANSLATION_HTTP_POOL_SIZE,
+        connect_timeout: float = settings.TRANSLATION_HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = settings.TRANSLATION_HTTP_READ_TIMEOUT,
+        retries: int = settings.TRANSLATION_HTTP_RETRIES,
+    ):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        # pool_block: при нехватке соединений ждём свободное, а не открываем новое
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; reader-translator)"})
+
+        self._get = retry(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            stop=stop_after_attempt(retries + 1),
+            wait=wait_exponential(multiplier=0.2, max=2),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            reraise=True,
+        )(self._get_once)
+
+    def _get_once(self, params: dict) -> str:
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        try:
+            if response.status_code == 429:
+                raise TooManyRequests()
+            if response.status_code >= 500:
+                raise RequestError()
+            response.raise_for_status()
+            return response.text
+        finally:
+            response.close()
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        text = text.strip()
+        if not text or source_lang == target_lang:
+            return text
+
+        html = self._get({"sl": source_lang, "tl": target_lang, "q": text})
+        soup = BeautifulSoup(html, "html.parser")
+        element = soup.find("div", {"class": "t0"}) or soup.find("div", {"class": "result-container"})
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class DeepTranslatorBackend(TranslatorBackend):
+    """Прямой вызов deep-translator без общего пула соединений"""
+
+    name = "deep_translator"
+
+    def __init__(self):
+        # Объект GoogleTranslator хранит состояние запроса, поэтому он свой у каждого потока
+        self._translators = threading.local()
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        cache = getattr(self._translators, "by_pair", None)
+        if cache is None:
+            cache = self._translators.by_pair = {}
+        translator = cache.get((source_lang, target_lang))
+        if translator is None:
+            translator = GoogleTranslator(source=source_lang, target=target_lang)
+            cache[(source_lang, target_lang)] = translator
+        return translator.translate(text)
+
+
+BACKENDS: Dict[str, Type[TranslatorBackend]] = {
+    GoogleWebBackend.name: GoogleWebBackend,
+    DeepTranslatorBackend.name: DeepTranslatorBackend,
+}
+
+
+def create_backend(name: str) -> TranslatorBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend '{name}', available: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# user_id -> ключ записи -> значения; последняя запись по ключу побеждает
+Batch = Dict[str, Dict[str, dict]]
+
+
+class WriteBehindBuffer:
+    """
+    Отложенная запись с групповым коммитом: записи всех запросов за окно window
+    уходят в базу одним вызовом write_batch (одна транзакция). Запрос получает
+    ответ сразу после попадания в буфер, поэтому чтения того же пользователя
+    должны учитывать ещё не записанное (pending / wait_for_user).
+
+    Если пачка не записалась, она пишется заново по пользователям и по строкам:
+    записанное остаётся в базе, а неудачная строка возвращается в буфер и после
+    max_attempts попыток отбрасывается с записью в лог.
+    """
+
+    def __init__(self, write_batch: Callable[[Batch], None], window: float, max_batch: int, max_attempts: int = 3):
+        self.write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self._pending: Batch = {}
+        self._in_flight: Batch = {}
+        # (user_id, ключ) -> число неудачных попыток записи
+        self._attempts: Dict[Tuple[str, str], int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.written = 0
+        self.max_batch_written = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def add(self, user_id: str, key: str, values: dict) -> None:
+        with self._lock:
+            items = self._pending.setdefault(user_id, {})
+            if key not in items:
+                self._size += 1
+            items.pop(key, None)
+            items[key] = values
+            # Новое значение пишется со своим счётчиком попыток
+            self._attempts.pop((user_id, key), None)
+            full = self._size >= self.max_batch
+        if full:
+            self._schedule(0)
+        elif self._timer is None:
+            self._schedule(self.window)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flushing = task
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def flush(self) -> None:
+        """Записывает всё, что накоплено к моменту вызова; вызовы выполняются по очереди"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending, self._size = self._pending, {}, 0
+                self._in_flight = batch
+            size = sum(len(items) for items in batch.values())
+            failed, error = await asyncio.to_thread(self._write, batch)
+            failed_size = sum(len(items) for items in failed.values())
+            with self._lock:
+                self._in_flight = {}
+                retrying = self._settle(batch, failed, error)
+            if size > failed_size:
+                self.batches += 1
+                self.written += size - failed_size
+                self.max_batch_written = max(self.max_batch_written, size - failed_size)
+            if failed:
+                self.failures += 1
+                logger.error(f"Write-behind flush failed for {failed_size} of {size} records, {retrying} will retry: {error}")
+                if retrying and self._timer is None:
+                    self._schedule(max(self.window, 1.0))
+                raise error
+
+    def _write(self, batch: Batch) -> Tuple[Batch, Optional[Exception]]:
+        """
+        Пишет пачку, а если она не записалась — её части: сначала по пользователям,
+        затем по строкам. Возвращает незаписанные строки и последнюю ошибку.
+        """
+        try:
+            self.write_batch(batch)
+            return {}, None
+        except Exception as e:
+            error = e
+        if len(batch) > 1:
+            parts = [{user_id: items} for user_id, items in batch.items()]
+        else:
+            [(user_id, items)] = batch.items()
+            if len(items) <= 1:
+                return batch, error
+            parts = [{user_id: {key: values}} for key, values in items.items()]
+        failed: Batch = {}
+        for part in parts:
+            part_failed, part_error = self._write(part)
+            for user_id, items in part_failed.items():
+                failed.setdefault(user_id, {}).update(items)
+            error = part_error or error
+        return failed, error
+
+    def _settle(self, batch: Batch, failed: Batch, error: Optional[Exception]) -> int:
+        """
+        Под self._lock: сбрасывает счётчики записанных строк, возвращает неудачные
+        в буфер или отбрасывает исчерпавшие попытки. Возвращает число оставленных.
+        """
+        if self._attempts:
+            for user_id, items in batch.items():
+                for key in items:
+                    if key not in failed.get(user_id, ()):
+                        self._attempts.pop((user_id, key), None)
+        retrying = 0
+        for user_id, items in failed.items():
+            newer = self._pending.get(user_id, {})
+            kept = {}
+            for key, values in items.items():
+                # Более новое значение из буфера важнее того, что не удалось записать
+                if key in newer:
+                    self._attempts.pop((user_id, key), None)
+                    continue
+                attempts = self._attempts.pop((user_id, key), 0) + 1
+                if attempts >= self.max_attempts:
+                    self.dropped += 1
+                    logger.error(f"Write-behind dropped {key!r} of user {user_id} after {attempts} attempts: {error}")
+                    continue
+                self._attempts[(user_id, key)] = attempts
+                kept[key] = values
+            if kept:
+                retrying += len(kept)
+                kept.update(newer)
+                self._pending[user_id] = kept
+        self._size = sum(len(items) for items in self._pending.values())
+        return retrying
+
+    def pending(self, user_id: str) -> Dict[str, dict]:
+        """Ещё не записанные в базу значения пользователя (можно вызывать из потоков)"""
+        with self._lock:
+            items = dict(self._in_flight.get(user_id, {}))
+            items.update(self._pending.get(user_id, {}))
+            return items
+
+    async def wait_for_user(self, user_id: str) -> None:
+        """Дожидается записи буфера, если у пользователя есть незаписанные значения"""
+        if self.pending(user_id):
+            await self.flush()
+            # Пока шла чужая запись, значения пользователя могли оказаться в следующей пачке
+            if self.pending(user_id):
+                await self.flush()
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = self._size
+        return {
+            "buffered": buffered,
+            "batches": self.batches,
+            "written": self.written,
+            "max_batch": self.max_batch_written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
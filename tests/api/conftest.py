@@ -0,0 +1,30 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Приложение при импорте создаёт uploads/, app.db и кэш переводов в текущем
+# каталоге — уводим их во временный, чтобы не трогать рабочую базу
+os.chdir(tempfile.mkdtemp(prefix="reader-api-tests-"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Новый пользователь на каждый тест: данные тестов не пересекаются"""
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    response = client.post("/api/register", json={"username": username, "password": "secret"})
+    assert response.status_code == 200, response.text
+    response = client.post("/api/token", data={"username": username, "password": "secret"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.mark.parametrize("languages", [
+    {"source_lang": "en"},
+    {"source_lang": "en", "target_lang": "russian language"},
+    {"source_lang": "e", "target_lang": "ru"},
+    {"source_lang": "en'; --", "target_lang": "ru"},
+])
+def test_add_word_rejects_invalid_language_pair(client, auth_headers, languages):
+    response = client.post("/api/dictionary", headers=auth_headers, json={
+        "word": "hello", "translation": "привет", **languages,
+    })
+    assert response.status_code == 400, response.text
+
+    response = client.get("/api/dictionary", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert "hello" not in response.text
+
+
+def test_import_reports_invalid_language_rows(client, auth_headers):
+    content = (
+        "word,translation,context,source_lang,target_lang\n"
+        "hello,привет,,en,ru\n"
+        "world,мир,,en,russian language\n"
+        "book,книга,,en,\n"
+    )
+    response = client.post(
+        "/api/dictionary/import", headers=auth_headers,
+        files={"file": ("words.csv", content.encode(), "text/csv")},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["imported"] == 1
+    assert body["skipped"] == 2
+    assert [error["line"] for error in body["errors"]] == [3, 4]
@@ -0,0 +1,38 @@
+def test_change_feed_returns_added_word(client, auth_headers):
+    response = client.post("/api/dictionary", headers=auth_headers, json={
+        "word": "hello", "translation": "привет", "source_lang": "en", "target_lang": "ru",
+    })
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/sync/changes", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["has_more"] is False
+    [word] = body["dictionary"]["upserted"]
+    assert word["word"] == "hello"
+    assert word["translation"] == "привет"
+    assert (word["source_lang"], word["target_lang"]) == ("en", "ru")
+
+    # Следующий запрос с полученным seq не возвращает уже виденное
+    response = client.get("/api/sync/changes", headers=auth_headers, params={"since": body["seq"]})
+    assert response.status_code == 200, response.text
+    assert response.json()["dictionary"]["upserted"] == []
+
+
+def test_change_feed_reports_deleted_word(client, auth_headers):
+    for word, translation in (("hello", "привет"), ("world", "мир")):
+        response = client.post("/api/dictionary", headers=auth_headers, json={"word": word, "translation": translation})
+        assert response.status_code == 200, response.text
+    seq = client.get("/api/sync/changes", headers=auth_headers).json()["seq"]
+
+    words = client.get("/api/dictionary", headers=auth_headers).json()["words"]
+    word_id = next(word["id"] for word in words if word["word"] == "hello")
+    response = client.delete(f"/api/dictionary/{word_id}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/sync/changes", headers=auth_headers, params={"since": seq})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["dictionary"]["upserted"] == []
+    assert body["dictionary"]["deleted"] == ["hello"]
+    assert body["seq"] > seq
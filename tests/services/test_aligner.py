@@ -0,0 +1,55 @@
+import random
+
+from app.services import aligner
+from app.services.aligner import Bead, align
+
+
+def covers_both_texts(beads, n, m) -> bool:
+    """Бусины идут подряд и покрывают оба текста без пропусков и наложений"""
+    i = j = 0
+    for bead in beads:
+        if (bead.source_start, bead.target_start) != (i, j):
+            return False
+        i, j = i + bead.source_count, j + bead.target_count
+    return (i, j) == (n, m)
+
+
+def test_equal_lengths_align_one_to_one():
+    lengths = [120, 80, 300, 45, 210]
+    beads = align(lengths, [int(length * 1.1) for length in lengths])
+    assert [(bead.source_count, bead.target_count) for bead in beads] == [(1, 1)] * len(lengths)
+    assert all(bead.confidence > 0.5 for bead in beads)
+
+
+def test_split_paragraph_becomes_one_to_two_bead():
+    source = [200, 400, 150, 250]
+    # Второй абзац в переводе разбит на два
+    target = [205, 190, 215, 148, 255]
+    beads = align(source, target)
+    assert covers_both_texts(beads, len(source), len(target))
+    assert Bead(1, 1, 1, 2, beads[1].confidence) == beads[1]
+
+
+def test_narrow_band_widens_to_the_full_alignment(monkeypatch):
+    rng = random.Random(7)
+    source = [rng.randint(100, 400) for _ in range(200)]
+    # Первая половина абзацев в переводе разбита надвое: к середине путь уходит
+    # от диагонали на 50 абзацев, дальше начальной полосы
+    target = []
+    for k, length in enumerate(source):
+        target += [length // 2, length - length // 2] if k < 100 else [length]
+
+    widths = []
+    banded = aligner._align_banded
+    monkeypatch.setattr(aligner, "_align_banded", lambda *args: widths.append(args[3]) or banded(*args))
+    beads = align(source, target, band=2, max_band=1000)
+
+    assert len(widths) > 1
+    assert [(bead.source_count, bead.target_count) for bead in beads] == [(1, 2)] * 100 + [(1, 1)] * 100
+    assert beads == align(source, target, band=1000, max_band=1000)
+
+
+def test_empty_side_leaves_paragraphs_unpaired():
+    beads = align([10, 20], [])
+    assert [(bead.source_count, bead.target_count) for bead in beads] == [(1, 0), (1, 0)]
+    assert covers_both_texts(beads, 2, 0)
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.translation_executor import BackendExecutor, TranslationOverloaded, TranslationTimeout
+
+
+def saturate(executor: BackendExecutor) -> threading.Event:
+    """Занимает единственный поток пула до release.set()"""
+    release = threading.Event()
+    executor._pool.submit(release.wait)
+    return release
+
+
+def test_cancelled_waiters_release_queue_slots():
+    executor = BackendExecutor("test", max_workers=1, max_queue=5)
+    release = saturate(executor)
+
+    async def scenario():
+        tasks = [asyncio.create_task(executor.run(lambda: "done")) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queued"] == 5
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert executor.stats()["queued"] == 0
+
+        # Очередь снова принимает задачи, а не отвечает TranslationOverloaded
+        release.set()
+        assert await executor.run(lambda: "done", timeout=1) == "done"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.stats()["queued"] == 0
+    assert executor.stats()["rejected"] == 0
+
+
+def test_timed_out_waiter_releases_queue_slot():
+    executor = BackendExecutor("test", max_workers=1, max_queue=1)
+    release = saturate(executor)
+
+    async def scenario():
+        with pytest.raises(TranslationTimeout):
+            await executor.run(lambda: "done", timeout=0.05)
+        assert executor.stats()["queued"] == 0
+        assert executor.stats()["timeouts"] == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_full_queue_rejects():
+    executor = BackendExecutor("test", max_workers=1, max_queue=1)
+    release = saturate(executor)
+
+    async def scenario():
+        waiter = asyncio.create_task(executor.run(lambda: "done"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(TranslationOverloaded):
+            await executor.run(lambda: "done")
+        release.set()
+        assert await waiter == "done"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.stats()["rejected"] == 1
@@ -0,0 +1,61 @@
+import threading
+
+from app.services.translation_memory import MemoryItem, TranslationMemory
+
+
+def make_memory(loader=None, **kwargs) -> TranslationMemory:
+    return TranslationMemory(shingle_size=2, threshold=0.85, min_fuzzy_words=6, loader=loader, **kwargs)
+
+
+def word(owner: str, source: str, translation: str) -> MemoryItem:
+    return MemoryItem(f"dict:{owner}:{source}", owner, source, translation, "en", "ru", fuzzy=False)
+
+
+def test_user_memory_is_loaded_on_first_lookup_and_capped():
+    loaded = []
+
+    def loader(owner):
+        loaded.append(owner)
+        return [word(owner, "hello", f"привет от {owner}")]
+
+    memory = make_memory(loader, max_owners=2)
+    assert memory.lookup("hello", "en", "ru", "a") == "привет от a"
+    assert memory.lookup("hello", "en", "ru", "a") == "привет от a"
+    assert loaded == ["a"]
+
+    # Чужие записи не отвечают, а самый давний пользователь вытесняется
+    assert memory.lookup("hello", "en", "ru", "b") == "привет от b"
+    assert memory.lookup("hello", "en", "ru", "c") == "привет от c"
+    assert memory.stats()["owners"] == 2
+    assert memory.lookup("hello", "en", "ru", "a") == "привет от a"
+    assert loaded == ["a", "b", "c", "a"]
+
+
+def test_replace_during_load_reaches_new_index():
+    started, release = threading.Event(), threading.Event()
+
+    def loader(owner):
+        # Загрузка прочитала базу до того, как слово было сохранено
+        started.set()
+        release.wait(5)
+        return [word(owner, "hello", "привет")]
+
+    memory = make_memory(loader)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(memory.lookup("world", "en", "ru", "a")))
+    reader.start()
+    assert started.wait(5)
+    memory.replace("a", "dict:a:world", [word("a", "world", "мир")])
+    release.set()
+    reader.join(5)
+
+    assert results == ["мир"]
+    assert memory.lookup("hello", "en", "ru", "a") == "привет"
+
+
+def test_replace_without_loader_fills_memory():
+    memory = make_memory()
+    memory.replace("a", "dict:a:hello", [word("a", "hello", "привет")])
+    assert memory.lookup("hello", "en", "ru", "a") == "привет"
+    memory.remove("a", "dict:a:hello")
+    assert memory.lookup("hello", "en", "ru", "a") is None
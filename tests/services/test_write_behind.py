@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.services.write_behind import WriteBehindBuffer
+
+
+class FakeStore:
+    """Запись пачки как одна транзакция: строка с bad в значении проваливает всю пачку"""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+
+    def write_batch(self, batch):
+        self.calls += 1
+        rows = {(user_id, key): values for user_id, items in batch.items() for key, values in items.items()}
+        if any(values.get("bad") for values in rows.values()):
+            raise ValueError("rejected row")
+        self.rows.update(rows)
+
+
+def test_flush_writes_buffered_rows_in_one_batch():
+    store = FakeStore()
+    buffer = WriteBehindBuffer(store.write_batch, window=60, max_batch=100)
+
+    async def scenario():
+        buffer.add("a", "hello", {"translation": "привет"})
+        buffer.add("b", "world", {"translation": "мир"})
+        buffer.add("a", "hello", {"translation": "здравствуй"})
+        assert buffer.pending("a") == {"hello": {"translation": "здравствуй"}}
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert store.calls == 1
+    assert store.rows == {("a", "hello"): {"translation": "здравствуй"}, ("b", "world"): {"translation": "мир"}}
+    assert buffer.stats()["buffered"] == 0
+
+
+def test_failing_row_does_not_block_batch_and_is_dropped():
+    store = FakeStore()
+    buffer = WriteBehindBuffer(store.write_batch, window=60, max_batch=100, max_attempts=2)
+
+    async def scenario():
+        buffer.add("a", "hello", {"translation": "привет"})
+        buffer.add("a", "broken", {"translation": "?", "bad": True})
+        buffer.add("b", "world", {"translation": "мир"})
+        with pytest.raises(ValueError):
+            await buffer.flush()
+        # Остальные строки записаны, в буфере ждёт повтора только неудачная
+        assert set(store.rows) == {("a", "hello"), ("b", "world")}
+        assert buffer.pending("a") == {"broken": {"translation": "?", "bad": True}}
+
+        with pytest.raises(ValueError):
+            await buffer.flush()
+        assert buffer.pending("a") == {}
+        await buffer.close()
+
+    asyncio.run(scenario())
+    stats = buffer.stats()
+    assert stats["dropped"] == 1
+    assert stats["written"] == 2
+    assert stats["buffered"] == 0
+
+
+def test_newer_value_replaces_failed_row():
+    store = FakeStore()
+    buffer = WriteBehindBuffer(store.write_batch, window=60, max_batch=100, max_attempts=1)
+
+    async def scenario():
+        buffer.add("a", "hello", {"translation": "?", "bad": True})
+        flushing = asyncio.ensure_future(buffer.flush())
+        await asyncio.sleep(0)
+        buffer.add("a", "hello", {"translation": "привет"})
+        with pytest.raises(ValueError):
+            await flushing
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert store.rows == {("a", "hello"): {"translation": "привет"}}
+    assert buffer.stats()["dropped"] == 0